@@ -0,0 +1,194 @@
+"""
+A local stand-in for the Azure OpenAI ChatCompletion endpoint, for benchmarks.
+
+    python benchmarks/fake_llm_server.py --port 8900 --latency-ms 800 --server-rpm 300 --error-rate 0.02
+
+then point the app at it:
+
+    AZURE_ENDPOINT=http://127.0.0.1:8900 API_KEY=fake DEPLOYMENT_NAME=bench API_VERSION=2023-05-15
+
+It answers POST /openai/deployments/{deployment}/chat/completions the way the real service
+does (including 429 with Retry-After and 5xx errors), with configurable latency, rate limit
+and failure rates. Instead of a model it "reads" the chunk: each requested field whose name
+appears in the text is answered with the text that follows it, up to the next field name or
+the end of the sentence, which is how the synthetic documents state their values.
+GET /stats reports what the server has seen.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fields import FIELD_NAMES  # noqa: E402
+
+# Field names in the text, longest first so "Payment Frequency Add. Description" wins over "Description"
+field_pattern = re.compile(
+    r"\b(?:" + "|".join(r"\s+".join(map(re.escape, field.split())) for field in sorted(FIELD_NAMES, key=len, reverse=True)) + r")",
+    re.IGNORECASE,
+)
+text_pattern = re.compile(r"Text to parse:\n(.*)\n\nFields to extract: (.*?)\n", re.DOTALL)
+
+def read_fields(text, fields):
+    """{field: value} for each requested field stated in 'text' as "<field> [is|:] <value>"."""
+    wanted = {" ".join(field.split()).lower(): field for field in fields}
+    found = {}
+    matches = list(field_pattern.finditer(text))
+    for match, next_match in zip(matches, matches[1:] + [None]):
+        field = wanted.get(" ".join(match.group(0).split()).lower())
+        if field is None or field in found:
+            continue
+        segment = text[match.end():next_match.start() if next_match else len(text)].split("\n")[0]
+        value = re.sub(r"^\s*(?:\(\w+\)\s*)?(?:is\s+|:\s*)?", "", segment).strip()
+        value = re.sub(r"\.$", "", value).strip()
+        if value:
+            found[field] = value
+    return found
+
+class RateLimiter:
+    """Fixed one-minute windows, like the per-deployment quota of the real service."""
+    def __init__(self, requests_per_minute):
+        self.limit = requests_per_minute
+        self.window = int(time.time() // 60)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def check(self):
+        """None if the request is allowed, else the seconds until the next window."""
+        if not self.limit:
+            return None
+        with self.lock:
+            now = time.time()
+            if int(now // 60) != self.window:
+                self.window, self.count = int(now // 60), 0
+            if self.count >= self.limit:
+                return 60 - now % 60
+            self.count += 1
+            return None
+
+def error(status, message, code, headers=None):
+    body = {"error": {"message": message, "type": "fake_server_error", "param": None, "code": code}}
+    return JSONResponse(body, status_code=status, headers=headers)
+
+def create_app(latency_ms=500.0, jitter_ms=200.0, ms_per_1k_tokens=0.0, requests_per_minute=0,
+               error_rate=0.0, malformed_rate=0.0, miss_rate=0.0, seed=None):
+    """
+    The fake service:
+    - each response takes latency_ms +/- jitter_ms, plus ms_per_1k_tokens per 1,000 prompt tokens;
+    - beyond requests_per_minute (0 = unlimited) requests get 429 with a Retry-After header;
+    - error_rate of requests fail with a 500, malformed_rate get a reply that is not JSON;
+    - miss_rate of the fields present in the text are left out of the answer.
+    """
+    app = FastAPI()
+    rng = random.Random(seed)
+    limiter = RateLimiter(requests_per_minute)
+    stats = {"requests": 0, "ok": 0, "rate_limited": 0, "errors": 0, "malformed": 0,
+             "prompt_tokens": 0, "completion_tokens": 0, "in_flight": 0, "max_in_flight": 0}
+    app.state.stats = stats
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        stats["requests"] += 1
+        retry_after = limiter.check()
+        if retry_after is not None:
+            stats["rate_limited"] += 1
+            return error(429, "Rate limit exceeded.", "429", headers={"Retry-After": str(max(1, round(retry_after)))})
+
+        body = await request.json()
+        prompt = "\n".join(message["content"] for message in body["messages"])
+        prompt_tokens = len(prompt) // 4
+
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            delay = latency_ms + rng.uniform(-jitter_ms, jitter_ms) + ms_per_1k_tokens * prompt_tokens / 1000
+            await asyncio.sleep(max(0.0, delay) / 1000)
+        finally:
+            stats["in_flight"] -= 1
+
+        if rng.random() < error_rate:
+            stats["errors"] += 1
+            return error(500, "The server had an error while processing your request.", "500")
+
+        match = text_pattern.search(body["messages"][-1]["content"])
+        text, fields = (match.group(1), match.group(2).split(", ")) if match else ("", [])
+        answer = {field: value for field, value in read_fields(text, fields).items() if rng.random() >= miss_rate}
+        content = json.dumps(answer)
+        if rng.random() < malformed_rate:
+            stats["malformed"] += 1
+            content = "Here is the data you asked for: " + content[:len(content) // 2]
+        else:
+            stats["ok"] += 1
+
+        completion_tokens = len(content) // 4
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        return {
+            "id": f"chatcmpl-fake-{stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    return app
+
+class BackgroundServer:
+    """Run an ASGI app with uvicorn on a daemon thread (for use from a benchmark script)."""
+    def __init__(self, app, host="127.0.0.1", port=8900):
+        self.url = f"http://{host}:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError(f"Fake LLM server failed to start on {self.url}")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self.thread.join()
+
+def add_server_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="Mean response time (default: 500)")
+    parser.add_argument("--jitter-ms", type=float, default=200.0, help="Uniform +/- jitter (default: 200)")
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=0.0, help="Extra latency per 1,000 prompt tokens")
+    parser.add_argument("--server-rpm", type=int, default=0, help="Requests per minute before 429s (default: unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with 500")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of replies that are not valid JSON")
+    parser.add_argument("--miss-rate", type=float, default=0.0, help="Share of present fields left out of replies")
+    parser.add_argument("--seed", type=int, default=None)
+
+def app_from_arguments(args):
+    return create_app(args.latency_ms, args.jitter_ms, args.ms_per_1k_tokens, args.server_rpm,
+                      args.error_rate, args.malformed_rate, args.miss_rate, args.seed)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Azure OpenAI ChatCompletion server for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+    uvicorn.run(app_from_arguments(args), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
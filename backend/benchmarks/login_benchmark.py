@@ -0,0 +1,88 @@
+"""
+Login load benchmark against a running API server.
+
+    uvicorn main:app --workers 1 &
+    python benchmarks/login_benchmark.py --url http://localhost:8000 --concurrency 50 --requests 500
+
+Registers the benchmark user (ignored if it already exists), then keeps 'concurrency'
+POST /login requests in flight until 'requests' have completed, and reports latency
+percentiles and throughput. Run it with different BCRYPT_ROUNDS / PASSWORD_HASH_WORKERS
+settings on the server to compare them.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile (q in 0..100) of an already sorted list."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, round(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+async def register(client, username, password):
+    response = await client.post("/register", json={
+        "username": username, "email": f"{username}@example.com", "password": password,
+    })
+    if response.status_code not in (200, 400):  # 400: already registered by an earlier run
+        raise RuntimeError(f"Registration failed: {response.status_code} {response.text}")
+
+async def run(url, username, password, concurrency, total, timeout):
+    latencies, errors = [], 0
+    remaining = total
+
+    async with httpx.AsyncClient(
+        base_url=url,
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    ) as client:
+        await register(client, username, password)
+
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/login", data={"username": username, "password": password})
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return sorted(latencies), errors, elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure /login latency under concurrent load.")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--concurrency", type=int, default=20, help="Logins in flight at once (default: 20)")
+    parser.add_argument("--requests", type=int, default=200, help="Total logins (default: 200)")
+    parser.add_argument("--username", default="login_benchmark", help="Benchmark account (registered if missing)")
+    parser.add_argument("--password", default="login-benchmark-password")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    args = parser.parse_args(argv)
+
+    latencies, errors, elapsed = asyncio.run(
+        run(args.url, args.username, args.password, args.concurrency, args.requests, args.timeout)
+    )
+    ms = [latency * 1000 for latency in latencies]
+    print(f"{args.requests} logins at concurrency {args.concurrency} in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.1f} logins/s), {errors} errors")
+    if ms:
+        print(f"latency ms: p50 {percentile(ms, 50):.1f}  p90 {percentile(ms, 90):.1f}  "
+              f"p99 {percentile(ms, 99):.1f}  max {ms[-1]:.1f}  mean {statistics.mean(ms):.1f}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+End-to-end scrape benchmark against the fake LLM server, on synthetic documents.
+
+    python benchmarks/run_benchmark.py --pages 5,20,80 --count 3 --concurrency 4 --latency-ms 300
+    python benchmarks/run_benchmark.py --mode api --json-out after.json --baseline before.json
+
+Generates documents with known values (synthetic_pdf.py, or --docs for an existing set),
+starts fake_llm_server.py on a free local port and points the pipeline at it, then runs:
+- "scrape": scrape() called directly, 'concurrency' documents at a time;
+- "api":    the FastAPI app in-process: POST /scrape, poll GET /scrape/{id}, fetch the
+            result and GET /download, one user per concurrent client.
+For each mode it reports latency percentiles, throughput, tokens, peak memory and field-level
+accuracy against the true values. The pipeline's own settings (MAX_CONCURRENCY,
+REQUESTS_PER_MINUTE, FAST_PATH, ...) are read from the environment as usual; the LLM response
+cache is off unless --cache is given, so repeated runs measure the same work.
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_llm_server import BackgroundServer, add_server_arguments, app_from_arguments  # noqa: E402
+from login_benchmark import percentile  # noqa: E402
+from synthetic_pdf import generate_corpus  # noqa: E402
+
+# Summary keys compared against a baseline, and whether higher is better
+COMPARED = {
+    "latency_p50": False, "latency_p95": False, "docs_per_minute": True, "pages_per_second": True,
+    "tokens_per_doc": False, "peak_rss_mb": False, "accuracy": True,
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def load_corpus(docs_dir):
+    """[(pdf_path, true_values)] for every PDF in 'docs_dir' with a .json next to it."""
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(docs_dir, "*.pdf"))):
+        truth_path = os.path.splitext(path)[0] + ".json"
+        if os.path.exists(truth_path):
+            with open(truth_path) as f:
+                corpus.append((path, json.load(f)))
+    return corpus
+
+def values_match(extracted, expected):
+    """Compare the way the workbook sees values: numbers by value, text ignoring case and spacing."""
+    from workbook import convert_value
+    if extracted in (None, ""):
+        return False
+    a, _ = convert_value(extracted)
+    b, _ = convert_value(expected)
+    if isinstance(a, float) and isinstance(b, float):
+        return abs(a - b) <= 1e-6 * max(1.0, abs(b))
+    return " ".join(str(a).split()).casefold() == " ".join(str(b).split()).casefold()
+
+def score(result, truth):
+    """{field: "correct" | "wrong" | "missing"}"""
+    outcome = {}
+    for field, expected in truth.items():
+        value = (result or {}).get(field)
+        if value in (None, ""):
+            outcome[field] = "missing"
+        else:
+            outcome[field] = "correct" if values_match(value, expected) else "wrong"
+    return outcome
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def run_scrape_mode(corpus, concurrency):
+    from scrape import scrape
+
+    def run(item):
+        path, truth = item
+        record = {"path": path, "error": None, "stats": {}}
+        started = time.perf_counter()
+        try:
+            record["result"] = scrape(path, stats=record["stats"])
+        except Exception as e:
+            record["result"], record["error"] = None, str(e)
+        record["seconds"] = time.perf_counter() - started
+        return record
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(run, corpus))
+
+def run_api_mode(corpus, concurrency, poll_seconds=0.1):
+    for name, value in {"DB_URL": "https://benchmark.supabase.co",
+                        "DB_PASSWORD": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark",
+                        "JWT_KEY": "benchmark", "JWT_ALGO": "HS256"}.items():
+        os.environ.setdefault(name, value)
+    from fastapi import Request
+    from fastapi.testclient import TestClient
+    import main
+
+    def current_user(request: Request):
+        return main.User(id=None, username=request.headers["X-Benchmark-User"], email="benchmark@example.com")
+
+    main.app.dependency_overrides[main.get_current_user] = current_user
+    client = TestClient(main.app)
+    local = threading.local()
+    counter = iter(range(1_000_000))
+
+    def run(item):
+        path, truth = item
+        record = {"path": path, "error": None, "stats": {}, "result": None}
+        # One user per client thread, so the per-user job limit does not serialize the run
+        if not hasattr(local, "headers"):
+            local.headers = {"X-Benchmark-User": f"benchmark-{next(counter)}"}
+        headers = local.headers
+        started = time.perf_counter()
+        try:
+            with open(path, "rb") as f:
+                response = client.post("/scrape", files={"file": (os.path.basename(path), f, "application/pdf")},
+                                       headers=headers)
+            response.raise_for_status()
+            job_id = response.json()["job_id"]
+            while True:
+                job = client.get(f"/scrape/{job_id}", headers=headers).json()
+                if job["status"] in ("done", "failed"):
+                    break
+                time.sleep(poll_seconds)
+            if job["status"] == "failed":
+                raise RuntimeError(job["error"])
+            response = client.get(f"/scrape/{job_id}/result", headers=headers)
+            response.raise_for_status()
+            record["result"] = response.json()["scrape_result"]
+            record["stats"]["timings"] = response.json().get("timings")
+            client.get("/download", params={"job_id": job_id}, headers=headers).raise_for_status()
+        except Exception as e:
+            record["error"] = str(e)
+        record["seconds"] = time.perf_counter() - started
+        return record
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(run, corpus))
+    finally:
+        main.app.dependency_overrides.pop(main.get_current_user, None)
+        for folder in glob.glob(os.path.join("uploads", "benchmark-*")):
+            shutil.rmtree(folder, ignore_errors=True)
+
+def summarize(records, corpus, elapsed, server_stats):
+    truth = dict(corpus)
+    pages = sum(page_count(path) for path, _ in corpus)
+    latencies = sorted(record["seconds"] for record in records)
+    tokens = server_stats["prompt_tokens"] + server_stats["completion_tokens"]
+
+    field_totals = {}
+    for record in records:
+        for field, outcome in score(record["result"], truth[record["path"]]).items():
+            field_totals.setdefault(field, {"correct": 0, "wrong": 0, "missing": 0})[outcome] += 1
+    correct = sum(counts["correct"] for counts in field_totals.values())
+    total = sum(sum(counts.values()) for counts in field_totals.values())
+
+    stage_totals = {}
+    for record in records:
+        for stage, seconds in (record["stats"].get("timings") or {}).items():
+            stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+
+    return {
+        "documents": len(records),
+        "failed": sum(1 for record in records if record["error"]),
+        "seconds": round(elapsed, 3),
+        "latency_p50": round(percentile(latencies, 50), 3),
+        "latency_p95": round(percentile(latencies, 95), 3),
+        "latency_max": round(latencies[-1], 3) if latencies else None,
+        "docs_per_minute": round(len(records) / elapsed * 60, 2),
+        "pages_per_second": round(pages / elapsed, 2),
+        "tokens_per_doc": round(tokens / max(1, len(records))),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "accuracy": round(correct / max(1, total), 4),
+        "fields": field_totals,
+        "stage_seconds": {stage: round(seconds, 3) for stage, seconds in stage_totals.items()},
+        "llm_server": server_stats,
+        "errors": sorted({record["error"] for record in records if record["error"]}),
+    }
+
+_page_counts = {}
+
+def page_count(path):
+    if path not in _page_counts:
+        import pypdfium2
+        pdf = pypdfium2.PdfDocument(path)
+        _page_counts[path] = len(pdf)
+        pdf.close()
+    return _page_counts[path]
+
+def print_summary(mode, summary, baseline=None):
+    print(f"\n== {mode}: {summary['documents']} documents, {summary['failed']} failed, {summary['seconds']:.1f}s")
+    for key in COMPARED:
+        line = f"  {key:18} {summary[key]}"
+        if baseline and key in baseline:
+            before, after = baseline[key], summary[key]
+            if before:
+                change = (after - before) / before * 100
+                better = (change > 0) == COMPARED[key]
+                line += f"   (baseline {before}, {change:+.1f}%{'' if abs(change) < 0.05 else ' better' if better else ' worse'})"
+        print(line)
+    print(f"  latency_max        {summary['latency_max']}")
+    if summary["stage_seconds"]:
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in summary["stage_seconds"].items())
+        print(f"  stage totals       {stages}")
+    server = summary["llm_server"]
+    print(f"  llm server         {server['requests']} requests, {server['rate_limited']} rate limited, "
+          f"{server['errors']} errors, {server['malformed']} malformed, max {server['max_in_flight']} in flight")
+    weak = {field: counts for field, counts in summary["fields"].items() if counts["wrong"] or counts["missing"]}
+    for field, counts in sorted(weak.items(), key=lambda item: item[1]["correct"]):
+        print(f"  {field:44} {counts['correct']} correct, {counts['wrong']} wrong, {counts['missing']} missing")
+    for error in summary["errors"][:5]:
+        print(f"  error: {error}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scrape pipeline against a fake LLM server.")
+    parser.add_argument("--mode", default="scrape", help="Comma-separated: scrape, api (default: scrape)")
+    parser.add_argument("--docs", help="Use the PDFs (with .json true values) in this directory instead of generating")
+    parser.add_argument("--pages", default="5,20,80", help="Page counts of generated documents (default: 5,20,80)")
+    parser.add_argument("--count", type=int, default=3, help="Generated documents per page count (default: 3)")
+    parser.add_argument("--table-fraction", type=float, default=0.7, help="Share of fields in the term sheet table")
+    parser.add_argument("--concurrency", type=int, default=4, help="Documents processed at once (default: 4)")
+    parser.add_argument("--cache", action="store_true", help="Leave the LLM response cache enabled")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report the Python heap peak (slower)")
+    parser.add_argument("--json-out", help="Write the summary to this file")
+    parser.add_argument("--baseline", help="A previous --json-out file to compare against")
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+
+    os.chdir(BACKEND_DIR)  # The app resolves its template and upload folders relative to here
+    if not args.cache:
+        os.environ["LLM_CACHE_ENABLED"] = "false"
+    fake_llm = app_from_arguments(args)
+    server = BackgroundServer(fake_llm, port=free_port())
+    os.environ.update(AZURE_ENDPOINT=server.url, API_KEY="fake", DEPLOYMENT_NAME="benchmark", API_VERSION="2023-05-15")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.docs:
+            corpus = load_corpus(args.docs)
+        else:
+            corpus = generate_corpus(tmp, args.count, [int(p) for p in args.pages.split(",")],
+                                     args.seed or 0, args.table_fraction)
+        if not corpus:
+            print("No documents to benchmark.")
+            return 1
+        print(f"{len(corpus)} documents, {sum(page_count(path) for path, _ in corpus)} pages; "
+              f"MAX_CONCURRENCY={os.getenv('MAX_CONCURRENCY', 'default')}, "
+              f"REQUESTS_PER_MINUTE={os.getenv('REQUESTS_PER_MINUTE', 'default')}, fake LLM at {server.url}")
+
+        baseline = {}
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+
+        results = {}
+        with server:
+            for mode in args.mode.split(","):
+                runner = {"scrape": run_scrape_mode, "api": run_api_mode}[mode]
+                fake_llm.state.stats["max_in_flight"] = 0
+                before = dict(fake_llm.state.stats)
+                if args.tracemalloc:
+                    tracemalloc.start()
+                started = time.perf_counter()
+                records = runner(corpus, args.concurrency)
+                elapsed = time.perf_counter() - started
+                after = fake_llm.state.stats
+                server_stats = {key: after[key] - before[key] for key in
+                                ("requests", "ok", "rate_limited", "errors", "malformed", "prompt_tokens", "completion_tokens")}
+                server_stats["max_in_flight"] = after["max_in_flight"]
+                summary = summarize(records, corpus, elapsed, server_stats)
+                if args.tracemalloc:
+                    summary["python_heap_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+                    tracemalloc.stop()
+                results[mode] = summary
+                print_summary(mode, summary, baseline.get(mode))
+                if args.tracemalloc:
+                    print(f"  python heap peak   {summary['python_heap_peak_mb']} MB")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSummary written to {args.json_out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+Synthetic MBS/ABS-style deal documents with known field values.
+
+    python benchmarks/synthetic_pdf.py --out bench_docs --count 5 --pages 40
+
+Each document is a term sheet table on page 1 holding some of the fields, followed by
+prospectus-style filler pages; the remaining fields are stated in sentences ("The Recoveries
+Lag is 6.") scattered over those pages, so they can only be found by reading the text.
+Next to every {name}.pdf the true values are written to {name}.json.
+
+The PDFs are written directly (Helvetica text, ruled tables), so no PDF library is needed.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import zlib
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fields import FIELD_NAMES  # noqa: E402
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+MARGIN = 36
+FONT_SIZE = 9
+LINE_HEIGHT = 12
+
+FILLER_SENTENCES = [
+    "The Certificates represent interests in a trust fund consisting primarily of a pool of mortgage loans.",
+    "Distributions on the Certificates will be made on the distribution date in each month, beginning in the month following the closing.",
+    "Investors should consider carefully the risk factors described in this prospectus supplement.",
+    "The Depositor will cause the mortgage loans to be assigned to the Trustee for the benefit of the certificateholders.",
+    "The yield to maturity of the offered certificates will be sensitive to the rate and timing of principal payments.",
+    "Losses on the mortgage loans will be allocated first to the subordinate certificates until their balances are reduced to zero.",
+    "The Servicer will be entitled to a servicing fee of {pct} per annum on the outstanding principal balance of each loan.",
+    "As of the cut-off date, approximately {pct} of the mortgage loans were secured by properties located in California.",
+    "No more than {pct} of the mortgage loans had a loan-to-value ratio greater than 80% at origination.",
+    "The Trustee will make available a monthly statement setting forth the information described under Reports to Holders.",
+    "Class A-{n} principal balance of ${amount} will be paid sequentially after the senior certificates.",
+    "The pass-through rate on the Class M-{n} Certificates will equal the lesser of one-month LIBOR plus {pct} and the net WAC cap.",
+    "Advances made by the Servicer will be reimbursable from collections on the related mortgage loan.",
+    "The final scheduled distribution date for each class is the distribution date occurring in {year}.",
+    "Optional termination may occur once the aggregate pool balance is less than {pct} of the cut-off balance.",
+]
+
+# -----------------------------------------------------------------------------
+# Deal values
+# -----------------------------------------------------------------------------
+def money(value):
+    return f"$ {value:,.0f}"
+
+def random_deal(rng):
+    """True values for every field, in the formats deal documents use."""
+    closing = date(rng.randint(1998, 2023), rng.randint(1, 12), 1)
+    first_payment = date(closing.year + closing.month // 12, closing.month % 12 + 1, 1)
+    original_term = rng.choice([120, 180, 240, 360])
+    wala = rng.randint(0, 24)
+    initial_balance = rng.randint(50, 900) * 1_000_000 + rng.randint(0, 999_999)
+    frequency = rng.choice(["Monthly", "Quarterly", "Semi-Annual"])
+    fixed_rate = f"{rng.uniform(2.5, 8.0):.3f}%"
+    return {
+        "Closing Date": f"{closing.month}/{closing.day}/{closing.year}",
+        "First Payment Date": f"{first_payment.month}/{first_payment.day}/{first_payment.year}",
+        "Day Count System": rng.choice(["30/360", "Actual/360", "Actual/365"]),
+        "Payment Frequency": frequency,
+        "Payment Frequency Add. Description": rng.choice(
+            ["25th of each month", "15th of each month", "1st business day"]),
+        "Description": f"Pool {rng.randint(1, 4)}",
+        "Rate Adjustment Frequency": str(rng.choice([1, 3, 6, 12])),
+        "Initial Asset Balance": money(initial_balance),
+        "Current Prepaid Balance": money(initial_balance * rng.uniform(0.7, 1.0)),
+        "Asset Amortization Type": rng.choice(["Fixed", "Level Pay", "Balloon"]),
+        "WA Fixed Rate": fixed_rate,
+        "Prepayment Type": rng.choice(["CPR", "PSA"]),
+        "Fixed Prepayment Rate": f"{rng.choice([6, 10, 15, 20, 30]):.2f}%",
+        "Default Rate": f"{rng.uniform(0.5, 20):.2f}%",
+        "Recoverable": f"{rng.choice([40, 60, 75, 90]):.2f}%",
+        "Original Term": str(original_term),
+        "Loss Multiple": f"{rng.choice([1, 1.5, 2]):.2f}",
+        "Base Losses": f"{rng.uniform(0.1, 5):.2f}%",
+        "Remaining Term": str(original_term - wala),
+        "Discount Rate": fixed_rate,
+        "WA Original Amortization Term": f"{original_term} Months",
+        "WA Original Balloon Payment Month": str(rng.choice([60, 84, 120, 300])),
+        "WA Original Interest Only Period": f"{rng.choice([0, 24, 48, 60])} Months",
+        "WA Original Interest Capitalization Period": f"{rng.choice([0, 6, 12])} Months",
+        "WALA": f"{wala} Months",
+        "Recoveries Lag": str(rng.choice([3, 6, 12])),
+    }
+
+def filler_sentence(rng):
+    return rng.choice(FILLER_SENTENCES).format(
+        pct=f"{rng.uniform(0.1, 30):.2f}%",
+        n=rng.randint(1, 9),
+        amount=f"{rng.randint(1, 500) * 100_000:,}",
+        year=rng.randint(2030, 2055),
+    )
+
+# -----------------------------------------------------------------------------
+# Minimal PDF writer
+# -----------------------------------------------------------------------------
+def pdf_string(text):
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+def text_width(text, size=FONT_SIZE):
+    return len(text) * size * 0.5  # Close enough for Helvetica at wrapping precision
+
+def wrap(text, width):
+    lines, line = [], ""
+    for word in text.split():
+        candidate = f"{line} {word}".strip()
+        if line and text_width(candidate) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    return lines + [line] if line else lines
+
+class Page:
+    def __init__(self):
+        self.ops = []
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def text(self, x, y, text, bold=False, size=FONT_SIZE):
+        font = "F2" if bold else "F1"
+        self.ops.append(f"BT /{font} {size} Tf {x:.1f} {y:.1f} Td {pdf_string(text)} Tj ET")
+
+    def rect(self, x, y, width, height):
+        self.ops.append(f"{x:.1f} {y:.1f} {width:.1f} {height:.1f} re S")
+
+    def paragraph(self, text):
+        """Write wrapped text at the cursor; False (and nothing written) if it does not fit."""
+        lines = wrap(text, PAGE_WIDTH - 2 * MARGIN)
+        if self.y - LINE_HEIGHT * (len(lines) + 1) < MARGIN:
+            return False
+        for line in lines:
+            self.text(MARGIN, self.y, line)
+            self.y -= LINE_HEIGHT
+        self.y -= LINE_HEIGHT // 2
+        return True
+
+    def table(self, rows, column_widths, row_height=16, size=8):
+        """A ruled grid; every cell gets a border so pdfplumber detects the table."""
+        for row in rows:
+            x = MARGIN
+            for cell, width in zip(row, column_widths):
+                self.rect(x, self.y - row_height, width, row_height)
+                if cell:
+                    self.text(x + 3, self.y - row_height + 5, cell, size=size)
+                x += width
+            self.y -= row_height
+        self.y -= LINE_HEIGHT
+
+def write_pdf(pages, path):
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Page tree, filled in once the page objects are numbered
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    page_refs = []
+    for page in pages:
+        content = zlib.compress("\n".join(page.ops).encode("latin-1"))
+        objects.append((f"<< /Length {len(content)} /Filter /FlateDecode >>", content))
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        page_refs.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(pages)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode()
+        if isinstance(obj, tuple):
+            out += obj[0].encode() + b"\nstream\n" + obj[1] + b"\nendstream"
+        else:
+            out += obj.encode()
+        out += b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+# -----------------------------------------------------------------------------
+# Documents
+# -----------------------------------------------------------------------------
+def generate_document(path, pages=20, seed=0, table_fraction=0.7):
+    """
+    Write a synthetic deal PDF of 'pages' pages to 'path' and its true values to the
+    matching .json file. 'table_fraction' of the fields go in the page-1 term sheet
+    table; the rest are stated in sentences on the following pages. Returns the values.
+    """
+    rng = random.Random(seed)
+    deal = random_deal(rng)
+    fields = list(FIELD_NAMES)
+    rng.shuffle(fields)
+    split = round(len(fields) * table_fraction) if pages > 1 else len(fields)
+    table_fields = [field for field in FIELD_NAMES if field in fields[:split]]
+    text_fields = fields[split:]
+
+    term_sheet = Page()
+    term_sheet.text(MARGIN, term_sheet.y, f"Mortgage Pass-Through Certificates, Series {rng.randint(2000, 2030)}-{rng.randint(1, 9)}", bold=True, size=12)
+    term_sheet.y -= 2 * LINE_HEIGHT
+    rows = [["Class.", "Input", "Class.", "Input"]]
+    for i in range(0, len(table_fields), 2):
+        pair = table_fields[i:i + 2]
+        row = []
+        for field in pair:
+            row += [field, deal[field]]
+        rows.append(row + [""] * (4 - len(row)))
+    term_sheet.table(rows, [175, 95, 175, 95])
+    while term_sheet.paragraph(filler_sentence(rng)):
+        pass
+    document = [term_sheet]
+
+    # Each remaining field is stated once, on a random later page
+    placements = {}
+    for field in text_fields:
+        placements.setdefault(rng.randint(1, pages - 1), []).append(field)
+    statements = []
+    for page_index in range(1, pages):
+        page = Page()
+        statements += [f"The {field} is {deal[field]}." for field in placements.get(page_index, [])]
+        while True:
+            # Statements are mixed in with the filler, and always written before the page fills up
+            nearly_full = page.y - MARGIN < LINE_HEIGHT * (3 * len(statements) + 4)
+            if statements and (nearly_full or rng.random() < 0.3):
+                if not page.paragraph(statements[-1]):
+                    break  # Carried over to the next page
+                statements.pop()
+            elif not page.paragraph(filler_sentence(rng)):
+                break
+        document.append(page)
+    while statements:
+        page = Page()
+        while statements and page.paragraph(statements[-1]):
+            statements.pop()
+        document.append(page)
+
+    write_pdf(document, path)
+    with open(os.path.splitext(path)[0] + ".json", "w") as f:
+        json.dump(deal, f, indent=2)
+    return deal
+
+def generate_corpus(out_dir, count=5, pages=(5, 20, 80), seed=0, table_fraction=0.7):
+    """Generate 'count' documents per page count; returns [(pdf_path, values)]."""
+    os.makedirs(out_dir, exist_ok=True)
+    corpus = []
+    for page_count in pages:
+        for i in range(count):
+            path = os.path.join(out_dir, f"deal-{page_count:04d}p-{i:03d}.pdf")
+            corpus.append((path, generate_document(path, page_count, seed=seed * 1_000_003 + page_count * 1000 + i,
+                                                   table_fraction=table_fraction)))
+    return corpus
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic deal PDFs with known field values.")
+    parser.add_argument("--out", default="bench_docs", help="Output directory (default: bench_docs)")
+    parser.add_argument("--count", type=int, default=5, help="Documents per page count (default: 5)")
+    parser.add_argument("--pages", default="5,20,80", help="Comma-separated page counts (default: 5,20,80)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--table-fraction", type=float, default=0.7,
+                        help="Share of fields placed in the page-1 table rather than in the text (default: 0.7)")
+    args = parser.parse_args(argv)
+
+    pages = [int(p) for p in args.pages.split(",")]
+    corpus = generate_corpus(args.out, args.count, pages, args.seed, args.table_fraction)
+    print(f"Wrote {len(corpus)} PDFs to {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import json
+import os
+from fields import FIELD_NAMES
+from workbook import convert_value
+
+# Distinct values remembered per field; later, different values only add to existing votes
+MAX_CANDIDATES = int(os.getenv("MAX_CANDIDATES_PER_FIELD", 5))
+
+# How much one sighting counts when resolving a field, by where it came from
+CONFIDENCE_WEIGHTS = {"high": 3.0, "medium": 2.0, "llm": 1.0}
+
+def clean_value(value):
+    """
+    A tidy version of an extracted value: whitespace collapsed and a trailing period dropped.
+    Accounting parentheses are left as they are ("(300)" is not turned into 300 or -300).
+    Numbers are kept as numbers, lists are joined with "; " and other structures are JSON-encoded.
+    """
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, list):
+        return "; ".join(str(clean_value(item)) for item in value if item not in (None, ""))
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return " ".join(str(value).split()).rstrip(".").strip()
+
+def normalize_value(value):
+    """
+    The key two sightings of a field are compared on: what the workbook would store.
+    "$ 1,000" and "$1000.00" agree; "100 Months" and "100" agree; text ignores case.
+    """
+    cell_value, number_format = convert_value(value)
+    if isinstance(cell_value, float):
+        return round(cell_value, 9), number_format
+    return " ".join(cell_value.split()).casefold(), None
+
+class Candidate:
+    __slots__ = ("value", "key", "weight", "votes", "confidence", "source")
+
+    def __init__(self, value, key, confidence, source):
+        self.value = value            # Cleaned value as first seen
+        self.key = key                # normalize_value(value)
+        self.weight = 0.0             # Sum of CONFIDENCE_WEIGHTS over sightings
+        self.votes = 0
+        self.confidence = confidence  # Best confidence among sightings
+        self.source = source          # Where it was first seen, e.g. {"source": "llm", "page": 3, "chunk": 1}
+
+class CandidateStore:
+    """
+    Per-field candidate values collected while a document is read, resolved once at the end.
+    Every sighting of a field is cleaned and normalized; sightings that normalize the same
+    are one candidate with more votes. At most 'max_candidates' distinct values are kept per
+    field, so memory stays bounded however many chunks repeat a field.
+    """
+    def __init__(self, max_candidates=MAX_CANDIDATES):
+        self.max_candidates = max_candidates
+        self.candidates = {}  # field -> [Candidate], in the order first seen
+
+    def add(self, field, value, source, confidence="llm"):
+        value = clean_value(value)
+        if value in (None, ""):
+            return
+        key = normalize_value(value)
+        entries = self.candidates.setdefault(field, [])
+        candidate = next((entry for entry in entries if entry.key == key), None)
+        if candidate is None:
+            if len(entries) >= self.max_candidates:
+                return
+            candidate = Candidate(value, key, confidence, source)
+            entries.append(candidate)
+        candidate.weight += CONFIDENCE_WEIGHTS.get(confidence, 1.0)
+        candidate.votes += 1
+        if CONFIDENCE_WEIGHTS.get(confidence, 1.0) > CONFIDENCE_WEIGHTS.get(candidate.confidence, 1.0):
+            candidate.confidence = confidence
+
+    def has(self, field):
+        return field in self.candidates
+
+    def leaders(self):
+        """{field: current best value}, for progress reports while reading."""
+        return {field: self._winner(entries).value for field, entries in self.candidates.items()}
+
+    @staticmethod
+    def _winner(entries):
+        # Highest weight wins; on a tie, the value seen first (earliest in the document)
+        return max(entries, key=lambda entry: (entry.weight, -entries.index(entry)))
+
+    def resolve(self):
+        """
+        Pick one value per field. Returns (values, confidence, sources):
+        - confidence is the winner's own marker ("high", "medium", "llm"), or "low" when
+          the field had conflicting values and the winner does not hold a majority of the weight;
+        - sources is where the winning value was first seen.
+        """
+        values, confidence, sources = {}, {}, {}
+        for field in FIELD_NAMES:
+            entries = self.candidates.get(field)
+            if not entries:
+                continue
+            winner = self._winner(entries)
+            values[field] = winner.value
+            total = sum(entry.weight for entry in entries)
+            confidence[field] = winner.confidence if winner.weight * 2 > total else "low"
+            sources[field] = winner.source
+        return values, confidence, sources
+
+    def conflicts(self):
+        """{field: [{"value", "votes", "source"}]} for every field that saw more than one value."""
+        return {
+            field: [{"value": entry.value, "votes": entry.votes, "source": entry.source} for entry in entries]
+            for field, entries in self.candidates.items() if len(entries) > 1
+        }
@@ -0,0 +1,145 @@
+"""
+Offline batch extraction, without the API server.
+
+    python cli.py /data/deals "/archive/2019/*.pdf" --out runs/backfill --workers 8
+
+For every PDF this writes one line to {out}/results.jsonl and a workbook to
+{out}/xlsx/. Completed files are recorded in {out}/manifest.jsonl (by path and
+SHA-256), so rerunning the same command after an interruption skips them.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def find_pdfs(inputs):
+    """Expand directories (recursively) and glob patterns into a sorted list of PDF paths."""
+    paths = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**", "*.pdf")
+        for path in glob.glob(pattern, recursive=True):
+            if path.lower().endswith(".pdf") and os.path.isfile(path):
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(manifest_path):
+    """SHA-256 of every file the manifest records as done."""
+    done = set()
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A line cut short by the interruption
+                if entry.get("status") == "done":
+                    done.add(entry["sha256"])
+    return done
+
+def init_worker(requests_per_minute):
+    """Give each worker process its share of the overall request rate."""
+    import scrape
+    scrape.rate_limiter = scrape.TokenBucket(requests_per_minute / 60.0, capacity=scrape.MAX_CONCURRENCY)
+
+def process_pdf(path, sha256, xlsx_dir):
+    """Worker: extract one PDF and write its workbook. Never raises; failures are returned."""
+    from scrape import scrape, save_to_excel
+    from workbook import TEMPLATE_FILE
+
+    record = {"path": path, "sha256": sha256, "status": "done", "error": None}
+    stats = {}
+    started = time.perf_counter()
+    try:
+        record["result"] = scrape(path, stats=stats)
+        if xlsx_dir:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            record["xlsx"] = os.path.join(xlsx_dir, f"{stem}-{sha256[:8]}.xlsx")
+            save_to_excel(record["result"], record["xlsx"], template_file=os.path.join(BACKEND_DIR, TEMPLATE_FILE))
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = str(e)
+    record["seconds"] = time.perf_counter() - started
+    record["pages"] = stats.get("pages", 0)
+    record["prompt_tokens"] = stats.get("prompt_tokens", 0)
+    record["completion_tokens"] = stats.get("completion_tokens", 0)
+    return record
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract deal fields from many PDFs into JSONL and xlsx files.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories (searched recursively) or glob patterns")
+    parser.add_argument("--out", default="cli_output", help="Output directory (default: cli_output)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    parser.add_argument("--requests-per-minute", type=float, default=None,
+                        help="Overall LLM request rate, split across workers; 0 for no limit (default: REQUESTS_PER_MINUTE)")
+    parser.add_argument("--no-xlsx", action="store_true", help="Only write results.jsonl")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    xlsx_dir = None if args.no_xlsx else os.path.join(args.out, "xlsx")
+    if xlsx_dir:
+        os.makedirs(xlsx_dir, exist_ok=True)
+    manifest_path = os.path.join(args.out, "manifest.jsonl")
+    results_path = os.path.join(args.out, "results.jsonl")
+
+    pdfs = find_pdfs(args.inputs)
+    done = load_manifest(manifest_path)
+    pending = []
+    queued = set()
+    for path in pdfs:
+        sha256 = file_sha256(path)
+        if sha256 not in done and sha256 not in queued:  # Identical copies are only processed once
+            pending.append((path, sha256))
+            queued.add(sha256)
+    print(f"{len(pdfs)} PDFs found, {len(pdfs) - len(pending)} already done or duplicates, {len(pending)} to process.")
+    if not pending:
+        return 0
+
+    rpm = args.requests_per_minute
+    if rpm is None:
+        rpm = float(os.getenv("REQUESTS_PER_MINUTE", 600))
+    totals = {"done": 0, "failed": 0, "pages": 0, "tokens": 0}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(rpm / args.workers,)) as executor, \
+            open(results_path, "a") as results, open(manifest_path, "a") as manifest:
+        futures = [executor.submit(process_pdf, path, sha256, xlsx_dir) for path, sha256 in pending]
+        for n, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            results.write(json.dumps(record) + "\n")
+            results.flush()
+            # The manifest is written after the result, so a recorded file always has its output
+            manifest.write(json.dumps({key: record[key] for key in ("path", "sha256", "status", "error")}) + "\n")
+            manifest.flush()
+
+            totals[record["status"]] += 1
+            totals["pages"] += record["pages"]
+            totals["tokens"] += record["prompt_tokens"] + record["completion_tokens"]
+            elapsed = time.perf_counter() - started
+            print(f"[{n}/{len(pending)}] {record['status']:6} {os.path.basename(record['path'])} "
+                  f"({record['seconds']:.1f}s, {record['pages']} pages)"
+                  + (f": {record['error']}" if record["error"] else ""))
+            print(f"    {n / elapsed * 60:.1f} PDFs/min, {totals['pages'] / elapsed:.1f} pages/s, "
+                  f"{totals['tokens'] / elapsed:.0f} tokens/s")
+
+    elapsed = time.perf_counter() - started
+    print(f"Finished in {elapsed:.1f}s: {totals['done']} done, {totals['failed']} failed. "
+          f"{len(pending) / elapsed * 60:.1f} PDFs/min, {totals['pages'] / elapsed:.1f} pages/s, "
+          f"{totals['tokens'] / elapsed:.0f} tokens/s.")
+    print(f"Results: {results_path}")
+    return 1 if totals["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import re
+from fields import FIELD_NAMES, FIELD_SYNONYMS
+from pdf_pages import TABLE, PageReader
+
+# Term sheets sit at the front of the document; only scan this many pages
+FAST_PATH_PAGES = 5
+
+# Which kind of value each field holds. Fields without an entry are free text and are only
+# taken from table cells, where the label/value pairing is unambiguous.
+VALUE_KINDS = {
+    "Closing Date": "date",
+    "First Payment Date": "date",
+    "Day Count System": "day_count",
+    "Payment Frequency": "frequency",
+    "Rate Adjustment Frequency": "number",
+    "Initial Asset Balance": "amount",
+    "Current Prepaid Balance": "amount",
+    "WA Fixed Rate": "percent",
+    "Fixed Prepayment Rate": "percent",
+    "Default Rate": "percent",
+    "Recoverable": "percent",
+    "Original Term": "number",
+    "Loss Multiple": "number",
+    "Base Losses": "percent",
+    "Remaining Term": "number",
+    "Discount Rate": "percent",
+    "WA Original Amortization Term": "number",
+    "WA Original Balloon Payment Month": "number",
+    "WA Original Interest Only Period": "number",
+    "WA Original Interest Capitalization Period": "number",
+    "WALA": "number",
+    "Recoveries Lag": "number",
+}
+
+VALUE_PATTERNS = {
+    "date": re.compile(r"\d{1,2}/\d{1,2}/\d{2,4}|[A-Z][a-z]+ \d{1,2}, \d{4}"),
+    "day_count": re.compile(r"(?:30|actual|act)/(?:360|365|actual|act)", re.IGNORECASE),
+    "frequency": re.compile(r"monthly|quarterly|semi-?annual(?:ly)?|annual(?:ly)?", re.IGNORECASE),
+    "amount": re.compile(r"\(?\s*\$\s*[\d,]*\d(?:\.\d+)?\s*\)?"),
+    "percent": re.compile(r"[\d,]*\d(?:\.\d+)?\s*%"),
+    "number": re.compile(r"\(?\s*[\d,]*\d(?:\.\d+)?\s*\)?(?:\s*(?:months?|years?))?(?![\d/%])", re.IGNORECASE),
+}
+
+# Label text -> field. When two fields share a synonym the first one in FIELD_NAMES wins.
+# Value-like synonyms ("30/360") are left out: they are what we are trying to read.
+LABELS = {}
+for _field in FIELD_NAMES:
+    for _label in [_field.lower()] + FIELD_SYNONYMS.get(_field, []):
+        if not re.search(r"[\d/]", _label):
+            LABELS.setdefault(_label, _field)
+
+# Longest labels first so "wa fixed rate" is preferred over "fixed rate"
+label_pattern = re.compile(
+    r"\b(?:" + "|".join(re.escape(label) for label in sorted(LABELS, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE,
+)
+# A text line stating one field: the label at the start of the line, an optional unit, then
+# a colon or dot leaders before the value ("Recoveries Lag (months): 6", "WALA ........ 42")
+text_line_pattern = re.compile(
+    r"^\s*(" + "|".join(re.escape(label) for label in sorted(LABELS, key=len, reverse=True)) + r")"
+    r"\s*(?:\((?:months?|years?|%)\))?\s*(?::|\.{2,}|\u2026+)[\s.]*(.+)$",
+    re.IGNORECASE,
+)
+
+def normalize_label(text):
+    """Collapse whitespace/newlines and drop a trailing unit such as "(months)"."""
+    text = " ".join(str(text).split()).rstrip(":").strip()
+    return re.sub(r"\s*\((?:months?|years?|%)\)$", "", text, flags=re.IGNORECASE).lower()
+
+def label_field(cell):
+    """
+    Field named by a table cell, or None. The cell must be a known label, optionally
+    preceded by a short qualifier ("Asset Amoritization Type", "Expected CGL Base Losses").
+    """
+    label = normalize_label(cell)
+    if label in LABELS:
+        return LABELS[label]
+    matches = list(label_pattern.finditer(label))
+    if matches and matches[-1].end() == len(label) and len(label.split()) <= 6:
+        return LABELS[matches[-1].group(0).lower()]
+    return None
+
+def match_value(field, text):
+    """
+    Return 'text' if all of it is a value of the kind expected for 'field', else None, so
+    "2019 vintage" or "3 to 5 years" are not read as a number. Numbers in years are refused
+    too: every term, age and lag field is in months. Accounting parentheses are kept, as
+    they are by candidates.clean_value: "($ 550,462,191)" is a negative amount.
+    """
+    match = VALUE_PATTERNS[VALUE_KINDS[field]].fullmatch(text.strip().rstrip(".").strip())
+    if not match or re.search(r"years?$", match.group(0), re.IGNORECASE):
+        return None
+    return match.group(0).strip()
+
+def extract_from_tables(page):
+    """Label/value pairs from pdfplumber tables: a cell holding a label, followed by its value cell."""
+    found = {}
+    for table in page.extract_tables():
+        for row in table:
+            cells = [cell if cell is not None else "" for cell in row]
+            for i, cell in enumerate(cells[:-1]):
+                field = label_field(cell)
+                if field is None or field in found:
+                    continue
+                raw_value = " ".join(next((c for c in cells[i + 1:] if c.strip()), "").split())
+                if not raw_value:
+                    continue
+                if field in VALUE_KINDS:
+                    value = match_value(field, raw_value)
+                    if value is not None:
+                        found[field] = {"value": value, "confidence": "high", "source": "table"}
+                # Free text is accepted unless it is the label of another field
+                elif label_field(raw_value) in (None, field):
+                    found[field] = {"value": raw_value, "confidence": "medium", "source": "table"}
+    return found
+
+def extract_from_text(text):
+    """
+    "Label: value" and "Label .... value" lines (see text_line_pattern). Only typed fields are
+    taken here, and only when everything after the separator parses as that type.
+    """
+    found = {}
+    for line in text.splitlines():
+        match = text_line_pattern.match(line)
+        if not match:
+            continue
+        field = LABELS[" ".join(match.group(1).split()).lower()]
+        if field in found or field not in VALUE_KINDS:
+            continue
+        value = match_value(field, match.group(2))
+        if value is not None:
+            found[field] = {"value": value, "confidence": "medium", "source": "text"}
+    return found
+
+def extract_fields_fast(pdf_path, max_pages=FAST_PATH_PAGES):
+    """
+    Rule-based extraction for well-formatted term sheets, without any LLM call.
+    Returns {field: {"value": ..., "confidence": "high" | "medium", "source": "table" | "text",
+    "page": page_number}} for every field it could fill from the first 'max_pages' pages.
+    Table hits take precedence over text-line hits. Tables are only looked for on pages
+    laid out as tables (see pdf_pages.classify_page).
+    """
+    found = {}
+    with PageReader(pdf_path) as reader:
+        for index in range(min(max_pages, len(reader))):
+            page_number = index + 1
+            text, kind, _ = reader.read(index, keep_layout=True)
+            if kind == TABLE:
+                page = reader.plumber_page(index)
+                for field, hit in extract_from_tables(page).items():
+                    if field not in found or found[field]["source"] != "table":
+                        found[field] = {**hit, "page": page_number}
+                page.close()
+            for field, hit in extract_from_text(text).items():
+                found.setdefault(field, {**hit, "page": page_number})
+            if len(found) == len(FIELD_NAMES):
+                break
+    return found
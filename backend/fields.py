@@ -0,0 +1,57 @@
+import re
+
+# List of fields to extract
+FIELDS = (
+    "Closing Date, First Payment Date, Day Count System, Payment Frequency, "
+    "Payment Frequency Add. Description, Description, Rate Adjustment Frequency, Initial Asset Balance, "
+    "Current Prepaid Balance, Asset Amortization Type, WA Fixed Rate, Prepayment Type, "
+    "Fixed Prepayment Rate, Default Rate, Recoverable, Original Term, Loss Multiple, Base Losses, "
+    "Remaining Term, Discount Rate, WA Original Amortization Term, WA Original Balloon Payment Month, "
+    "WA Original Interest Only Period, WA Original Interest Capitalization Period, WALA, Recoveries Lag"
+)
+FIELD_NAMES = [field.strip() for field in FIELDS.split(",")]
+
+# Labels / synonyms each field tends to appear under in term sheets and prospectuses
+# (lowercase; includes misspellings seen in real deal documents)
+FIELD_SYNONYMS = {
+    "Closing Date": ["closing date"],
+    "First Payment Date": ["first payment date", "first distribution date"],
+    "Day Count System": ["day count", "30/360", "actual/360", "actual/365"],
+    "Payment Frequency": ["payment frequency", "distribution frequency"],
+    "Payment Frequency Add. Description": ["payment frequency", "distribution date"],
+    "Description": ["description"],
+    "Rate Adjustment Frequency": ["rate adjustment frequency", "rate adjustment", "reset frequency"],
+    "Initial Asset Balance": ["initial asset balance", "initial asset ballance", "initial pool balance",
+                              "cut-off date balance", "aggregate principal balance"],
+    "Current Prepaid Balance": ["current prepaid balance", "current prepayed ballance", "current balance"],
+    "Asset Amortization Type": ["amortization type", "amoritization type", "fully amortizing"],
+    "WA Fixed Rate": ["wa fixed rate", "weighted average fixed rate", "weighted average coupon",
+                      "wac", "fixed rate", "mortgage rate"],
+    "Prepayment Type": ["prepayment type", "cpr", "psa"],
+    "Fixed Prepayment Rate": ["fixed prepayment rate", "prepayment rate", "prepayment speed"],
+    "Default Rate": ["default rate", "cdr"],
+    "Recoverable": ["recoverable", "recovery rate", "loss severity"],
+    "Original Term": ["original term"],
+    "Loss Multiple": ["loss multiple"],
+    "Base Losses": ["base losses", "expected losses"],
+    "Remaining Term": ["remaining term"],
+    "Discount Rate": ["discount rate"],
+    "WA Original Amortization Term": ["original amortization term", "amortization term"],
+    "WA Original Balloon Payment Month": ["balloon payment month", "balloon payment", "balloon"],
+    "WA Original Interest Only Period": ["interest only period", "interest-only period"],
+    "WA Original Interest Capitalization Period": ["interest capitalization period", "capitalization period"],
+    "WALA": ["wala", "weighted average loan age", "loan age", "seasoning"],
+    "Recoveries Lag": ["recoveries lag", "recovery lag"],
+}
+
+FIELD_PATTERNS = {
+    field: re.compile(r"\b(?:" + "|".join(re.escape(s) for s in synonyms) + r")\b", re.IGNORECASE)
+    for field, synonyms in FIELD_SYNONYMS.items()
+}
+
+# Unanchored versions of the value regexes: "$ 550,462,191", "3.866%", "2/1/2000"
+value_pattern = re.compile(
+    r"\$\s*[\d,]*\d(?:\.\d+)?"
+    r"|\b\d[\d,]*(?:\.\d+)?\s*%"
+    r"|\b\d{1,2}/\d{1,2}/\d{2,4}\b"
+)
@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# -----------------------------------------------------------------------------
+# Settings
+# -----------------------------------------------------------------------------
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", 4))            # Jobs processed at once
+SCRAPE_QUEUE_SIZE = int(os.getenv("SCRAPE_QUEUE_SIZE", 20))     # Jobs allowed to wait for a worker
+MAX_JOBS_PER_USER = int(os.getenv("MAX_JOBS_PER_USER", 2))      # Queued + running jobs per user
+MAX_FINISHED_JOBS = int(os.getenv("MAX_FINISHED_JOBS", 500))    # Finished jobs (and results) kept in memory
+MAX_FINISHED_BYTES = int(os.getenv("MAX_FINISHED_MB", 256)) * 1024 * 1024  # ...and the memory they may hold
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", 24 * 3600))  # Finished jobs expire after this long
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity."""
+
+class UserLimitError(Exception):
+    """Raised when a user already has MAX_JOBS_PER_USER unfinished jobs."""
+
+class Job:
+    """State of one background job. 'status' is queued -> running -> done | failed."""
+    def __init__(self, username: str, filename: str, sha256: Optional[str] = None, kind: str = "scrape"):
+        self.id = uuid.uuid4().hex
+        self.username = username
+        self.filename = filename
+        self.kind = kind  # "scrape" (one PDF), "batch" or "reextract" (fields of a finished scrape)
+        self.sha256 = sha256  # Hash of the uploaded file, used to reuse finished results
+        self.status = "queued"
+        self.progress: Dict[str, Any] = {}
+        # Every progress event, in order (for streaming). Once the job finishes, all but the last
+        # are replaced by None, so indexes held by open streams stay valid
+        self.events: List[Optional[Dict[str, Any]]] = []
+        self.result: Any = None
+        self.stats: Dict[str, Any] = {}  # Filled by the job function: counts, tokens, per-stage timings
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.size = 0  # Approximate bytes held by the finished job (see compact)
+        self.future: Optional[Future] = None  # Completes once the job has finished
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def compact(self) -> None:
+        """
+        Drop the progress snapshots of a finished job except the last one (each carries the
+        partial result), and measure what it still holds: result, stats (including chunk
+        texts) and events.
+        """
+        for i in range(len(self.events) - 1):
+            self.events[i] = None
+        self.size = len(json.dumps([self.result, self.stats, self.events[-1:]], default=str))
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "filename": self.filename,
+            "sha256": self.sha256,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "timings": self.stats.get("timings"),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class JobManager:
+    """
+    Runs jobs on a bounded thread pool so long scrapes never block the event loop.
+    - At most 'workers' jobs run at once and at most 'queue_size' more may wait;
+      beyond that submit() raises QueueFullError.
+    - Each user may have at most 'per_user' unfinished jobs (UserLimitError).
+    - Finished jobs, with their results, form an LRU store: they expire 'ttl' seconds
+      after finishing, and beyond 'max_finished' jobs or 'max_finished_bytes' (see
+      Job.compact) the least recently used are dropped.
+    """
+    def __init__(self, workers: int = SCRAPE_WORKERS, queue_size: int = SCRAPE_QUEUE_SIZE,
+                 per_user: int = MAX_JOBS_PER_USER, max_finished: int = MAX_FINISHED_JOBS,
+                 ttl: int = JOB_TTL_SECONDS, max_finished_bytes: int = MAX_FINISHED_BYTES):
+        self.capacity = workers + queue_size
+        self.per_user = per_user
+        self.max_finished = max_finished
+        self.max_finished_bytes = max_finished_bytes
+        self.ttl = ttl
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scrape")
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()  # Least recently used first
+        self.done_by_hash: Dict[str, str] = {}  # File SHA-256 -> id of a job that finished on it
+        self.lock = threading.Lock()
+
+    def submit(self, username: str, filename: str, func: Callable[..., Any], *args,
+               sha256: Optional[str] = None, kind: str = "scrape", **kwargs) -> Job:
+        """
+        Queue func(*args, progress=..., stats=..., **kwargs) as a job for 'username'.
+        'progress' is a callback (event, info) that records the latest info on the job;
+        'stats' is the job's stats dict, for the function to fill in.
+        """
+        job = Job(username, filename, sha256, kind)
+        with self.lock:
+            self._evict()
+            active = [j for j in self.jobs.values() if not j.finished]
+            if len(active) >= self.capacity:
+                raise QueueFullError("The scrape queue is full. Please try again shortly.")
+            if sum(1 for j in active if j.username == username) >= self.per_user:
+                raise UserLimitError(f"You already have the maximum of {self.per_user} scrapes in progress.")
+            self.jobs[job.id] = job
+
+        def progress(event: str, info: dict) -> None:
+            job.events.append({"event": event, **info})
+            job.progress = {"event": event, **{k: v for k, v in info.items() if k != "data"}}
+
+        def run() -> None:
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = func(*args, progress=progress, stats=job.stats, **kwargs)
+                outcome = "done"
+            except Exception as e:
+                job.error = str(e)
+                outcome = "failed"
+            job.compact()
+            # finished_at is set first: a job only counts as finished once it has one
+            job.finished_at = time.time()
+            job.status = outcome
+            with self.lock:
+                if outcome == "done" and sha256:
+                    self.done_by_hash[sha256] = job.id
+                if job.id in self.jobs:
+                    self.jobs.move_to_end(job.id)  # Its result is about to be fetched
+                self._evict()
+
+        job.future = self.executor.submit(run)
+        return job
+
+    def find_done(self, sha256: str) -> Optional[Job]:
+        """A finished, successful job for a file with this SHA-256, if there is one."""
+        job = self.jobs.get(self.done_by_hash.get(sha256, ""))
+        return job if job is not None and job.status == "done" else None
+
+    def add_done(self, username: str, filename: str, source: Job) -> Job:
+        """Record a job for 'username' that reuses the result of the finished job 'source'."""
+        job = Job(username, filename, source.sha256)
+        job.result = source.result
+        job.stats = source.stats
+        job.status = "done"
+        job.progress = {"event": "done", "reused_job_id": source.id}
+        job.events.append({"event": "done", "reused_job_id": source.id, "data": dict(source.result)})
+        job.compact()
+        job.started_at = job.finished_at = time.time()
+        with self.lock:
+            self.jobs[job.id] = job
+            self._evict()
+        return job
+
+    def get(self, job_id: str, username: Optional[str] = None) -> Optional[Job]:
+        """Look up a job; if 'username' is given, only that user's jobs are visible."""
+        with self.lock:
+            self._evict()
+            job = self.jobs.get(job_id)
+            if job is None or (username is not None and job.username != username):
+                return None
+            self.jobs.move_to_end(job_id)
+        return job
+
+    def has_unfinished(self, username: str) -> bool:
+        """Whether the user has a queued or running job."""
+        with self.lock:
+            return any(j.username == username and not j.finished for j in self.jobs.values())
+
+    def latest_done(self, username: str) -> Optional[Job]:
+        """The user's most recently finished successful scrape or batch job."""
+        with self.lock:
+            done = [j for j in self.jobs.values()
+                    if j.username == username and j.status == "done" and j.kind != "reextract"]
+        return max(done, key=lambda j: j.finished_at, default=None)
+
+    def _evict(self) -> None:
+        # Caller holds self.lock
+        now = time.time()
+        finished = [j for j in self.jobs.values() if j.finished]
+        expired = [j for j in finished if now - j.finished_at > self.ttl]
+        live = [j for j in finished if now - j.finished_at <= self.ttl]
+        excess = max(0, len(live) - self.max_finished)
+        dropped, live = expired + live[:excess], live[excess:]
+        total = sum(j.size for j in live)
+        for job in live:
+            if total <= self.max_finished_bytes:
+                break
+            dropped.append(job)
+            total -= job.size
+        for job in dropped:
+            del self.jobs[job.id]
+            if self.done_by_hash.get(job.sha256) == job.id:
+                del self.done_by_hash[job.sha256]
+
+job_manager = JobManager()
@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+import time
+from typing import List
+
+import httpx
+from metrics import registry
+
+# -----------------------------------------------------------------------------
+# Settings
+# -----------------------------------------------------------------------------
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 10))   # Seconds to open a connection
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 120))        # Seconds to wait for a completion
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 16))     # Pooled connections per client
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", 60))  # Idle pooled connections are closed after this
+LLM_ROUTING = os.getenv("LLM_ROUTING", "round_robin")               # "round_robin" or "failover"
+# Optional JSON list of deployments, e.g. [{"endpoint": "https://a.openai.azure.com", "deployment": "gpt4",
+# "api_key": "..."}, {"endpoint": "https://b.openai.azure.com"}]. Missing keys default to the
+# single deployment configured with AZURE_ENDPOINT / DEPLOYMENT_NAME / API_KEY / API_VERSION.
+LLM_DEPLOYMENTS = os.getenv("LLM_DEPLOYMENTS")
+
+deployment_requests_total = registry.counter(
+    "llm_deployment_requests_total",
+    "HTTP requests per model deployment (position in LLM_DEPLOYMENTS and deployment name), by result: "
+    "ok, http status or error.", ["deployment", "result"])
+
+class LLMError(Exception):
+    """A failed completion request. 'status' is None for timeouts and connection errors."""
+    def __init__(self, message, status=None, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+    @property
+    def retryable(self):
+        """Rate limits, server-side failures, timeouts and dropped connections are worth retrying."""
+        return self.status is None or self.status in (408, 409, 429) or self.status >= 500
+
+class Deployment:
+    """One Azure OpenAI deployment: where to send chat completions and how to authenticate."""
+    def __init__(self, endpoint, deployment, api_key, api_version):
+        self.endpoint = (endpoint or "").rstrip("/")
+        self.deployment = deployment
+        self.api_key = api_key
+        self.api_version = api_version
+        self.url = f"{self.endpoint}/openai/deployments/{deployment}/chat/completions"
+        self.cooldown_until = 0.0  # Skipped until then after a 429 with Retry-After
+        self.index = 0  # Position in the client's list of deployments
+
+    @property
+    def key(self):
+        return self.endpoint, self.deployment, self.api_key, self.api_version
+
+    @property
+    def name(self):
+        """How the deployment appears in metrics and errors; the endpoint URL is left out."""
+        return f"{self.index}:{self.deployment}"
+
+def retry_after_seconds(headers):
+    try:
+        return float(headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+class LLMClient:
+    """
+    A long-lived chat completion client over one or more deployments.
+    - One pooled httpx client (keep-alive, bounded connections, explicit timeouts) is shared by
+      every thread.
+    - 'routing' is "round_robin" (each request starts at the next deployment) or "failover"
+      (always the first one that works). Either way, a retryable failure moves on to the
+      next deployment, and a deployment that answered 429 with Retry-After is skipped
+      until then (unless every deployment is cooling down).
+    Retries with backoff are left to the caller; a request fails once every deployment has.
+    """
+    def __init__(self, deployments: List[Deployment], routing: str = LLM_ROUTING,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT, read_timeout: float = LLM_READ_TIMEOUT,
+                 max_connections: int = LLM_MAX_CONNECTIONS):
+        if not deployments:
+            raise ValueError("At least one deployment is required.")
+        if routing not in ("round_robin", "failover"):
+            raise ValueError(f"Unknown routing {routing!r}; use 'round_robin' or 'failover'.")
+        self.deployments = deployments
+        for index, deployment in enumerate(deployments):
+            deployment.index = index
+        self.routing = routing
+        self.http = httpx.Client(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=LLM_KEEPALIVE_SECONDS),
+        )
+        self.next_index = 0
+        self.lock = threading.Lock()
+
+    def order(self):
+        """Deployments in the order this request should try them."""
+        with self.lock:
+            start = self.next_index
+            if self.routing == "round_robin":
+                self.next_index = (self.next_index + 1) % len(self.deployments)
+        rotated = self.deployments[start:] + self.deployments[:start]
+        now = time.monotonic()
+        ready = [d for d in rotated if d.cooldown_until <= now]
+        return ready or sorted(rotated, key=lambda d: d.cooldown_until)
+
+    def request_args(self, deployment, messages, params):
+        return {
+            "url": deployment.url,
+            "params": {"api-version": deployment.api_version},
+            "headers": {"api-key": deployment.api_key or "", "Content-Type": "application/json"},
+            "content": json.dumps({"messages": messages, **params}),
+        }
+
+    def handle(self, deployment, response):
+        """The parsed completion, or an LLMError for a failed response."""
+        if response.status_code == 200:
+            deployment_requests_total.inc(deployment=deployment.name, result="ok")
+            return response.json()
+        deployment_requests_total.inc(deployment=deployment.name, result=str(response.status_code))
+        try:
+            message = response.json()["error"]["message"]
+        except Exception:
+            message = response.text[:500]
+        if response.status_code == 429:
+            wait = retry_after_seconds(response.headers)
+            if wait:
+                deployment.cooldown_until = time.monotonic() + wait
+        raise LLMError(f"{deployment.name}: HTTP {response.status_code}: {message}",
+                       status=response.status_code, headers=response.headers)
+
+    def transport_error(self, deployment, error):
+        deployment_requests_total.inc(deployment=deployment.name, result="error")
+        return LLMError(f"{deployment.name}: {type(error).__name__}: {error}")
+
+    def chat(self, messages, **params):
+        """POST a chat completion (temperature, max_tokens, ... as keyword arguments); returns the response JSON."""
+        error = None
+        for deployment in self.order():
+            try:
+                response = self.http.post(**self.request_args(deployment, messages, params))
+            except httpx.TransportError as e:
+                error = self.transport_error(deployment, e)
+                continue
+            try:
+                return self.handle(deployment, response)
+            except LLMError as e:
+                if not e.retryable:
+                    raise
+                error = e
+        raise error
+
+    def close(self):
+        self.http.close()
+
+def configured_deployments(endpoint, deployment, api_key, api_version, deployments_json=LLM_DEPLOYMENTS):
+    """The deployments to use: LLM_DEPLOYMENTS if set (with missing keys defaulted), else the one given."""
+    if not deployments_json:
+        return [Deployment(endpoint, deployment, api_key, api_version)]
+    return [
+        Deployment(entry.get("endpoint", endpoint), entry.get("deployment", deployment),
+                   entry.get("api_key", api_key), entry.get("api_version", api_version))
+        for entry in json.loads(deployments_json)
+    ]
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(endpoint, deployment, api_key, api_version):
+    """
+    The process-wide client for these settings, created on first use. Worker processes
+    (e.g. the CLI's) each create their own, after they start.
+    """
+    deployments = configured_deployments(endpoint, deployment, api_key, api_version)
+    key = tuple(d.key for d in deployments)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = LLMClient(deployments)
+        return _clients[key]
@@ -1,15 +1,29 @@
 import os
+import asyncio
+import threading
+import hashlib
+import io
+import json
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Any
+from typing import Optional, Any, List
 from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.responses import FileResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from supabase import create_client, Client
 import bcrypt
 from jose import JWTError, jwt
 from dotenv import load_dotenv
-from scrape import scrape
+from scrape import scrape, scrape_fields, missing_fields
+from fields import FIELD_NAMES
+from jobs import job_manager, QueueFullError, UserLimitError
+from workbook import get_template, render_workbook, render_batch_workbook
+from metrics import registry
 from fastapi.middleware.cors import CORSMiddleware
 import shutil
 
@@ -27,6 +41,9 @@ app.add_middleware(
 
 load_dotenv()
 
+# Parse the Excel template once at startup instead of on every scrape
+get_template()
+
 # -----------------------------------------------------------------------------
 # Supabase setup
 # -----------------------------------------------------------------------------
@@ -45,6 +62,33 @@ SECRET_KEY = os.getenv("JWT_KEY")
 ALGORITHM = os.getenv("JWT_ALGO")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# -----------------------------------------------------------------------------
+# Authenticated user cache settings
+# -----------------------------------------------------------------------------
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", 300))  # How long a looked-up user is trusted
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", 1000))  # Users kept; least recently used dropped
+
+# -----------------------------------------------------------------------------
+# Password hashing settings
+# -----------------------------------------------------------------------------
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))  # Cost of new hashes (each +1 doubles the work)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))  # bcrypt calls run at once
+
+# -----------------------------------------------------------------------------
+# Scrape progress streaming settings
+# -----------------------------------------------------------------------------
+SSE_POLL_SECONDS = 0.25       # How often the event stream checks a job for new events
+SSE_KEEPALIVE_SECONDS = 15    # Comment line sent on idle streams so proxies keep them open
+
+# -----------------------------------------------------------------------------
+# Upload settings
+# -----------------------------------------------------------------------------
+UPLOAD_BLOCK_BYTES = 1024 * 1024                                      # Uploads are copied to disk 1 MB at a time
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", 100)) * 1024 * 1024  # Larger uploads are rejected (413)
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", 100))             # PDFs accepted in one batch (zips included)
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_MB", 1024)) * 1024 * 1024  # Total PDF bytes in one batch, once unzipped
+BATCH_FILE_CONCURRENCY = int(os.getenv("BATCH_FILE_CONCURRENCY", 4))  # PDFs of one batch processed at once
+
 # -----------------------------------------------------------------------------
 # Pydantic Models
 # -----------------------------------------------------------------------------
@@ -66,6 +110,51 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+class ReextractRequest(BaseModel):
+    fields: Optional[List[str]] = None  # Default: missing and low-confidence fields
+
+# -----------------------------------------------------------------------------
+# Authenticated user cache
+# -----------------------------------------------------------------------------
+class UserCache:
+    """
+    Users looked up by get_current_user, keyed by the JWT subject (the username), so a
+    protected request does not need a Supabase round trip. Entries expire 'ttl' seconds
+    after they were fetched and beyond 'max_entries' the least recently used are dropped.
+    Call invalidate() whenever a user's row is created or changed.
+    """
+    def __init__(self, ttl: int = USER_CACHE_TTL_SECONDS, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()  # username -> (fetched_at, User)
+        self.lock = threading.Lock()
+
+    def get(self, username: str) -> Optional[User]:
+        with self.lock:
+            entry = self.entries.get(username)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self.entries[username]
+                return None
+            self.entries.move_to_end(username)
+            return entry[1]
+
+    def put(self, username: str, user: User) -> None:
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[username] = (time.monotonic(), user)
+            self.entries.move_to_end(username)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, username: str) -> None:
+        with self.lock:
+            self.entries.pop(username, None)
+
+user_cache = UserCache()
+
 # -----------------------------------------------------------------------------
 # OAuth2PasswordBearer
 # -----------------------------------------------------------------------------
@@ -75,13 +164,25 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 # Password hashing utilities
 # -----------------------------------------------------------------------------
 def hash_password(plain_password: str) -> str:
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(plain_password.encode("utf-8"), salt)
     return hashed.decode("utf-8")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
 
+# bcrypt releases the GIL, so a thread pool hashes in parallel. Its own bounded pool keeps a
+# login burst from taking over the threads that serve every other request.
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+async def hash_password_async(plain_password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(password_executor, hash_password, plain_password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(
+        password_executor, verify_password, plain_password, hashed_password
+    )
+
 # -----------------------------------------------------------------------------
 # JWT creation & decoding
 # -----------------------------------------------------------------------------
@@ -103,6 +204,7 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     """
     Extract and validate the current user from the JWT in the Authorization header.
     If invalid or expired, raise HTTPException(401).
+    Users are served from user_cache when possible; Supabase is only queried on a miss.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -118,6 +220,10 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     except JWTError:
         raise credentials_exception
 
+    cached = user_cache.get(username)
+    if cached is not None:
+        return cached
+
     # Query user from DB
     try:
         result = (
@@ -130,7 +236,7 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         if not result.data:
             raise credentials_exception
         user_record = result.data[0]
-        return User(
+        user = User(
             id=str(user_record.get("id")),
             username=user_record["username"],
             email=user_record["email"],
@@ -140,11 +246,14 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     except Exception:
         raise credentials_exception
 
+    user_cache.put(username, user)
+    return user
+
 # -----------------------------------------------------------------------------
 # Login (token generation) Endpoint
 # -----------------------------------------------------------------------------
 @app.post("/login", response_model=Token)
-def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Logs in a user using OAuth2PasswordRequestForm:
       - form_data.username
@@ -154,12 +263,12 @@ def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
     """
     # 1) Retrieve user by username
     try:
-        result = (
+        result = await asyncio.to_thread(
             supabase
             .table("users")
-            .select("*")
+            .select("username, password")
             .eq("username", form_data.username)
-            .execute()
+            .execute
         )
     except Exception as e:
         raise HTTPException(
@@ -176,7 +285,7 @@ def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
     user_record = result.data[0]
 
     # 2) Verify password
-    if not verify_password(form_data.password, user_record["password"]):
+    if not await verify_password_async(form_data.password, user_record["password"]):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect username or password."
@@ -194,8 +303,14 @@ def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
 # -----------------------------------------------------------------------------
 # Register Endpoint
 # -----------------------------------------------------------------------------
+UNIQUE_VIOLATION = "23505"  # Postgres error code for a duplicate key
+
+def postgrest_quote(value: str) -> str:
+    """Quote a value for a PostgREST filter string, so commas and parentheses in it are literal."""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
 @app.post("/register")
-def register_user(user: RegisterUser):
+async def register_user(user: RegisterUser):
     """
     Example user registration. Accepts a JSON body:
     {
@@ -207,30 +322,24 @@ def register_user(user: RegisterUser):
     }
     """
 
-    # Check if username already exists
-    check = (
-        supabase
-        .table("users")
-        .select("*")
-        .eq("username", user.username)
-        .execute()
-    )
-    if check.data:
+    # Check if the username or email is already taken, in one query
+    try:
+        check = await asyncio.to_thread(
+            supabase
+            .table("users")
+            .select("username, email")
+            .or_(f"username.eq.{postgrest_quote(user.username)},email.eq.{postgrest_quote(user.email)}")
+            .execute
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if any(row["username"] == user.username for row in check.data):
         raise HTTPException(status_code=400, detail="Username already taken.")
-    
-    # Check if email already exists
-    check = (
-        supabase
-        .table("users")
-        .select("*")
-        .eq("email", user.email)
-        .execute()
-    )
     if check.data:
         raise HTTPException(status_code=400, detail="There is already an account with this email.")
 
     # Insert new user with hashed password
-    hashed_pw = hash_password(user.password)
+    hashed_pw = await hash_password_async(user.password)
     new_user_data = {
         "username": user.username,
         "email": user.email,
@@ -239,9 +348,15 @@ def register_user(user: RegisterUser):
         "last_name": user.last_name,
     }
     try:
-        supabase.table("users").insert(new_user_data).execute()
+        await asyncio.to_thread(supabase.table("users").insert(new_user_data).execute)
     except Exception as e:
+        # A concurrent registration can pass the check above; the unique constraints still catch it
+        if getattr(e, "code", None) == UNIQUE_VIOLATION:
+            detail = "There is already an account with this email." if "email" in str(e) else "Username already taken."
+            raise HTTPException(status_code=400, detail=detail)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    # Drop anything cached under this username (e.g. a user that was deleted and re-created)
+    user_cache.invalidate(user.username)
 
     return {"message": "User registered successfully."}
 
@@ -264,13 +379,66 @@ def get_user_profile(current_user: User = Depends(get_current_user)):
 # -----------------------------------------------------------------------------
 # PDF Scrape Endpoint
 # -----------------------------------------------------------------------------
-@app.post("/scrape")
+async def save_upload(file: UploadFile, folder: str, max_bytes: int = MAX_UPLOAD_BYTES) -> tuple:
+    """
+    Stream an upload to disk in UPLOAD_BLOCK_BYTES blocks, hashing it on the way.
+    The file is stored under a unique name in 'folder'. Returns (path, sha256).
+    Raises HTTPException(413) if it is larger than 'max_bytes'.
+    """
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"{file.filename} is larger than the {max_bytes // (1024 * 1024)} MB allowed for it."
+    )
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+
+    os.makedirs(folder, exist_ok=True)
+    save_path = os.path.join(folder, f"{uuid.uuid4().hex}.pdf")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(save_path, "wb") as buffer:
+            while True:
+                block = await file.read(UPLOAD_BLOCK_BYTES)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise too_large
+                digest.update(block)
+                buffer.write(block)
+    except BaseException:
+        remove_upload(save_path)
+        raise
+
+    return save_path, digest.hexdigest()
+
+def remove_upload(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def scrape_upload(save_path: str, progress=None, stats=None) -> dict:
+    """
+    Job body for /scrape: run the pipeline on an uploaded PDF, then delete the upload.
+    The result lives on the job, so nothing is left behind on disk.
+    """
+    try:
+        return scrape(save_path, progress=progress, stats=stats)
+    finally:
+        remove_upload(save_path)
+
+@app.post("/scrape", status_code=status.HTTP_202_ACCEPTED)
 async def scrape_pdf(file: UploadFile = File(...), current_user: Any = Depends(get_current_user)):
     """
     Protected endpoint that:
     - Accepts a PDF file upload.
-    - Saves the file to 'uploads/{username}/{PDF_FILE}'.
-    - Returns the JSON result.
+    - Streams the file to 'uploads/{username}/' (it is deleted once the job finishes).
+    - Queues the scrape as a background job and returns its id right away.
+      Poll GET /scrape/{job_id} for progress and GET /scrape/{job_id}/result for the JSON result.
+    - If the same file (by SHA-256) was already scraped, the job is created finished,
+      reusing the stored result, and the pipeline is not run again.
     """
 
     if not file.filename.lower().endswith(".pdf"):
@@ -281,67 +449,394 @@ async def scrape_pdf(file: UploadFile = File(...), current_user: Any = Depends(g
 
     username = current_user.username
     user_uploads_folder = os.path.join("uploads", username)
-    os.makedirs(user_uploads_folder, exist_ok=True)
-
-    save_path = os.path.join(user_uploads_folder, file.filename)
 
     try:
-        with open(save_path, "wb") as buffer:
-            buffer.write(await file.read())
+        save_path, sha256 = await save_upload(file, user_uploads_folder)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error saving uploaded file: {str(e)}"
         )
 
+    previous = job_manager.find_done(sha256)
+    if previous is not None:
+        remove_upload(save_path)
+        return job_manager.add_done(username, file.filename, previous).to_dict()
+
     try:
-        result = scrape(save_path, username)
-    except Exception as e:
+        job = job_manager.submit(username, file.filename, scrape_upload, save_path, sha256=sha256)
+    except UserLimitError as e:
+        remove_upload(save_path)
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    except QueueFullError as e:
+        remove_upload(save_path)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "30"}
+        )
+
+    return job.to_dict()
+
+def batch_too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+
+def extract_zip_pdfs(zip_path: str, folder: str, max_files: int = MAX_BATCH_FILES,
+                     max_bytes: int = MAX_BATCH_BYTES) -> List[tuple]:
+    """
+    Copy every PDF inside a zip archive to 'folder' under a unique name, in 1 MB blocks.
+    Returns [(filename, path)]. Extraction stops with 413 at the first member larger than
+    MAX_UPLOAD_BYTES, or once more than 'max_files' PDFs or 'max_bytes' in total would be
+    written. Sizes are counted as members are decompressed, not taken from the archive's
+    headers, and nothing is left on disk when it stops.
+    """
+    extracted = []
+    total = 0
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            for member in archive.infolist():
+                name = os.path.basename(member.filename)
+                if member.is_dir() or not name.lower().endswith(".pdf") or member.filename.startswith("__MACOSX"):
+                    continue
+                if len(extracted) >= max_files:
+                    raise batch_too_large(f"A batch may contain at most {MAX_BATCH_FILES} PDFs.")
+                path = os.path.join(folder, f"{uuid.uuid4().hex}.pdf")
+                extracted.append((name, path))
+                size = 0
+                with archive.open(member) as source, open(path, "wb") as target:
+                    while True:
+                        block = source.read(UPLOAD_BLOCK_BYTES)
+                        if not block:
+                            break
+                        size += len(block)
+                        total += len(block)
+                        if size > MAX_UPLOAD_BYTES:
+                            raise batch_too_large(f"{name} is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+                        if total > max_bytes:
+                            raise batch_too_large(
+                                f"A batch may contain at most {MAX_BATCH_BYTES // (1024 * 1024)} MB of PDFs.")
+                        target.write(block)
+    except BaseException:
+        for _, path in extracted:
+            remove_upload(path)
+        raise
+    return extracted
+
+def scrape_batch(documents: List[tuple], progress=None, stats=None) -> dict:
+    """
+    Job body for /scrape/batch: run scrape_upload on every (filename, path), up to
+    BATCH_FILE_CONCURRENCY at a time. A failing file is recorded with its error and
+    does not stop the others. LLM rate and in-flight limits are shared process-wide.
+    stats["timings"] sums the per-file stage timings; "total" is the batch's wall time.
+    """
+    entries = [{"filename": name, "status": "queued", "seconds": 0.0, "error": None, "result": None,
+                "timings": None} for name, _ in documents]
+    done = []
+    batch_started = time.perf_counter()
+
+    def run(index: int) -> None:
+        entry = entries[index]
+        entry["status"] = "running"
+        started = time.perf_counter()
+        file_stats = {}
+        try:
+            entry["result"] = scrape_upload(documents[index][1], stats=file_stats)
+            entry["status"] = "done"
+        except Exception as e:
+            entry["error"] = str(e)
+            entry["status"] = "failed"
+        entry["seconds"] = time.perf_counter() - started
+        entry["timings"] = file_stats.get("timings")
+        done.append(index)
+        if progress is not None:
+            progress("file", {
+                "filename": entry["filename"],
+                "file_status": entry["status"],
+                "files_done": len(done),
+                "files_total": len(entries),
+            })
+
+    with ThreadPoolExecutor(max_workers=BATCH_FILE_CONCURRENCY) as executor:
+        list(executor.map(run, range(len(documents))))
+    if stats is not None:
+        timings = {}
+        for entry in entries:
+            for stage, seconds in (entry["timings"] or {}).items():
+                if stage != "total":
+                    timings[stage] = round(timings.get(stage, 0.0) + seconds, 3)
+        stats["timings"] = {**timings, "total": round(time.perf_counter() - batch_started, 3)}
+    return {
+        "files": entries,
+        "succeeded": sum(1 for entry in entries if entry["status"] == "done"),
+        "failed": sum(1 for entry in entries if entry["status"] == "failed"),
+    }
+
+@app.post("/scrape/batch", status_code=status.HTTP_202_ACCEPTED)
+async def scrape_batch_pdfs(files: List[UploadFile] = File(...), current_user: Any = Depends(get_current_user)):
+    """
+    Protected endpoint that accepts many PDFs and/or zip archives of PDFs and queues them
+    as a single batch job. GET /scrape/{job_id} reports per-file progress, the result lists
+    per-file status, timing and errors, and GET /download?job_id=... returns one workbook
+    with a Summary sheet and an Inputs-style sheet per deal. A batch may hold at most
+    MAX_BATCH_FILES PDFs and MAX_BATCH_MB of PDF data once unzipped (413 beyond either).
+    """
+    for file in files:
+        if not file.filename.lower().endswith((".pdf", ".zip")):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Only PDF and zip files are allowed."
+            )
+
+    username = current_user.username
+    user_uploads_folder = os.path.join("uploads", username)
+    documents = []
+    batch_bytes = 0
+    try:
+        for file in files:
+            if file.filename.lower().endswith(".zip"):
+                # A zip holds a whole batch, so it is bounded by what is left of the batch, not the per-PDF limit
+                save_path, _ = await save_upload(file, user_uploads_folder, MAX_BATCH_BYTES - batch_bytes)
+                try:
+                    extracted = await asyncio.to_thread(
+                        extract_zip_pdfs, save_path, user_uploads_folder,
+                        MAX_BATCH_FILES - len(documents), MAX_BATCH_BYTES - batch_bytes)
+                    documents += extracted
+                    batch_bytes += sum(os.path.getsize(path) for _, path in extracted)
+                except zipfile.BadZipFile:
+                    raise HTTPException(status_code=400, detail=f"{file.filename} is not a valid zip file.")
+                finally:
+                    remove_upload(save_path)
+            else:
+                save_path, _ = await save_upload(file, user_uploads_folder)
+                documents.append((file.filename, save_path))
+                batch_bytes += os.path.getsize(save_path)
+            if len(documents) > MAX_BATCH_FILES:
+                raise batch_too_large(f"A batch may contain at most {MAX_BATCH_FILES} PDFs.")
+            if batch_bytes > MAX_BATCH_BYTES:
+                raise batch_too_large(f"A batch may contain at most {MAX_BATCH_BYTES // (1024 * 1024)} MB of PDFs.")
+        if not documents:
+            raise HTTPException(status_code=400, detail="No PDF files found in the upload.")
+
+        job = job_manager.submit(username, f"{len(documents)} PDFs", scrape_batch, documents, kind="batch")
+    except BaseException as e:
+        for _, path in documents:
+            remove_upload(path)
+        if isinstance(e, UserLimitError):
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+        if isinstance(e, QueueFullError):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e),
+                headers={"Retry-After": "30"}
+            )
+        raise
+
+    return job.to_dict()
+
+@app.get("/scrape/{job_id}")
+async def scrape_status(job_id: str, current_user: Any = Depends(get_current_user)):
+    """
+    Status and progress of one of the current user's scrape jobs.
+    """
+    job = job_manager.get(job_id, current_user.username)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
+
+@app.get("/scrape/{job_id}/events")
+async def scrape_events(job_id: str, current_user: Any = Depends(get_current_user)):
+    """
+    Server-sent event stream of a scrape job's progress. Every event carries the counts
+    from GET /scrape/{job_id} plus the partial merged JSON ('data'); the stream ends with a
+    'complete' event holding the final job status and result.
+    """
+    job = job_manager.get(job_id, current_user.username)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def event_stream():
+        sent = 0
+        idle = 0.0
+        while True:
+            finished = job.finished  # Read before draining so no event is missed
+            while sent < len(job.events):
+                event = job.events[sent]
+                sent += 1
+                if event is None:  # An intermediate snapshot dropped once the job finished
+                    continue
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+                idle = 0.0
+            if finished:
+                complete = {**job.to_dict(), "scrape_result": job.result}
+                yield f"event: complete\ndata: {json.dumps(complete)}\n\n"
+                return
+            await asyncio.sleep(SSE_POLL_SECONDS)
+            idle += SSE_POLL_SECONDS
+            if idle >= SSE_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/scrape/{job_id}/result")
+async def scrape_result(job_id: str, current_user: Any = Depends(get_current_user)):
+    """
+    The JSON result of a finished scrape job.
+    """
+    job = job_manager.get(job_id, current_user.username)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job.status == "failed":
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error during PDF scraping: {str(e)}"
+            detail=f"Error during PDF scraping: {job.error}"
         )
+    if job.status != "done":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job is still running.")
 
-    return {"scrape_result": result}
+    return {
+        "scrape_result": job.result,
+        "confidence": job.stats.get("confidence"),
+        "sources": job.stats.get("sources"),
+        "timings": job.stats.get("timings"),
+    }
+
+# Ids of scrape jobs with a re-extraction queued or running. Only touched on the event loop.
+reextracting = set()
+
+@app.post("/scrape/{job_id}/reextract")
+async def reextract_scrape_fields(job_id: str, request: Optional[ReextractRequest] = None,
+                                  current_user: Any = Depends(get_current_user)):
+    """
+    Ask the model again for some fields of a finished scrape (default: the missing and
+    low-confidence ones), using only the stored chunks most likely to contain them.
+    The work runs as a "reextract" job, under the same queue and per-user limits as a
+    scrape. New values are merged into the job's result, so GET /download includes them.
+    """
+    username = current_user.username
+    job = job_manager.get(job_id, username)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job.kind != "scrape":
+        raise HTTPException(status_code=400, detail="Only single-file scrapes can be re-extracted.")
+    if job.status != "done":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job is not finished.")
+    chunks = job.stats.get("chunks")
+    if chunks is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="No stored text for this job.")
+    if job.id in reextracting:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="This job is already being re-extracted.")
+
+    if request is not None and request.fields:
+        fields = list(dict.fromkeys(request.fields))
+        unknown = [field for field in fields if field not in FIELD_NAMES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    else:
+        confidence = job.stats.get("confidence") or {}
+        fields = missing_fields(job.result) + [field for field in FIELD_NAMES if confidence.get(field) == "low"]
+
+    found = {}
+    retry_stats = {}
+    if fields and chunks:
+        try:
+            retry = job_manager.submit(username, job.filename, scrape_fields, chunks, fields,
+                                       job.stats.get("chunk_pages"), kind="reextract")
+        except UserLimitError as e:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+        except QueueFullError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e),
+                headers={"Retry-After": "30"}
+            )
+        reextracting.add(job.id)
+        try:
+            await asyncio.wrap_future(retry.future)
+        finally:
+            reextracting.discard(job.id)
+        if retry.status == "failed":
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error during re-extraction: {retry.error}"
+            )
+        found, retry_stats = retry.result, retry.stats
+
+    # Merged into the job as it is now, with no await in between. New dicts rather than
+    # in-place updates: jobs that reused this result keep their own copy
+    job.result = {**job.result, **found}
+    job.stats = {
+        **job.stats,
+        "confidence": {**(job.stats.get("confidence") or {}), **{field: "llm" for field in found}},
+        "sources": {**(job.stats.get("sources") or {}), **retry_stats.get("sources", {})},
+    }
+    return {
+        "scrape_result": job.result,
+        "reextracted": found,
+        "still_missing": missing_fields(job.result),
+        "chunks_sent": retry_stats.get("chunks_sent", 0),
+        "timings": retry_stats.get("timings"),
+    }
 
 # -----------------------------------------------------------------------------
 # Excel download Endpoint
 # -----------------------------------------------------------------------------
 @app.get("/download")
-async def download(current_user: Any = Depends(get_current_user)):
+async def download(job_id: Optional[str] = None, current_user: Any = Depends(get_current_user)):
+    """
+    Stream the Excel workbook for a finished scrape or batch job (default: the user's latest one).
+    The workbook is rendered in memory from the stored result on every request.
+    """
     username = current_user.username
     if not username:
         raise HTTPException(status_code=400, detail="User not found.")
-    
-    file_path = f"downloads/{username}/output.xlsx"
-    
-    if not os.path.exists(file_path):
+
+    job = job_manager.get(job_id, username) if job_id else job_manager.latest_done(username)
+    if job is None or job.status != "done" or job.kind == "reextract":
         raise HTTPException(status_code=404, detail="Excel file not found.")
-    
-    return FileResponse(
-        path=file_path,
-        filename="output.xlsx",
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    if job.kind == "batch":
+        content = await asyncio.to_thread(render_batch_workbook, job.result["files"])
+    else:
+        content = await asyncio.to_thread(render_workbook, job.result)
+    return StreamingResponse(
+        io.BytesIO(content),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": 'attachment; filename="output.xlsx"'}
     )
 
 # -----------------------------------------------------------------------------
-# Logout and delete files (upload, download)
+# Metrics Endpoint
+# -----------------------------------------------------------------------------
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Pipeline metrics in the Prometheus text format: time per stage, pages, chunks,
+    LLM request latency, results and tokens (see metrics.py).
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+# -----------------------------------------------------------------------------
+# Logout and delete leftover uploads
 # -----------------------------------------------------------------------------
 @app.post("/logout")
-async def download(current_user: Any = Depends(get_current_user)):
+async def logout(current_user: Any = Depends(get_current_user)):
+    """
+    Log out and delete the user's upload folder. Each job deletes its own upload when it
+    finishes, so while the user still has queued or running jobs, whose PDFs are in that
+    folder, it is left alone.
+    """
     username = current_user.username
     if not username:
         raise HTTPException(status_code=400, detail="User not found.")
-    
-    downloads = f"downloads/{username}"
-    uploads = f"uploads/{username}"
-    
-    for directory in (downloads, uploads):
-        if os.path.exists(directory) and os.path.isdir(directory):
-            try:
-                shutil.rmtree(directory)
-                print(f"Deleted directory: {directory}")
-            except Exception as e:
-                print(f"Error deleting {directory}: {e}")
-        else:
-            print(f"Directory {directory} does not exist.")
\ No newline at end of file
+    user_cache.invalidate(username)
+
+    uploads = os.path.join("uploads", username)
+    if not job_manager.has_unfinished(username):
+        shutil.rmtree(uploads, ignore_errors=True)
\ No newline at end of file
@@ -0,0 +1,176 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def format_number(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+class Counter:
+    """A monotonically increasing value per combination of label values."""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, format_labels(self.labelnames, key), value) for key, value in sorted(self.values.items())]
+
+class Histogram:
+    """Observations counted into cumulative 'le' buckets, with their sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.values = {}  # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            entry = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, entry in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, entry):
+                    le = (("le", format_number(bound)),)
+                    samples.append((self.name + "_bucket", format_labels(self.labelnames, key, le), count))
+                samples.append((self.name + "_sum", format_labels(self.labelnames, key), entry[-2]))
+                samples.append((self.name + "_count", format_labels(self.labelnames, key), entry[-1]))
+        return samples
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# -----------------------------------------------------------------------------
+# Scrape pipeline metrics
+# -----------------------------------------------------------------------------
+stage_seconds = registry.counter(
+    "scrape_stage_seconds_total",
+    "Time spent in each pipeline stage (nested stages are not counted twice).", ["stage"])
+scrape_seconds = registry.histogram(
+    "scrape_duration_seconds", "Wall-clock time of a whole document extraction.")
+pages_total = registry.counter("scrape_pages_total", "PDF pages read.")
+page_reads_total = registry.counter(
+    "scrape_page_reads_total",
+    "PDF pages by how their text was read: text_layer, pdfplumber, ocr, cache or no_ocr.", ["method"])
+chunks_total = registry.counter(
+    "scrape_chunks_total", "Text chunks produced, by whether they were sent to the model.", ["outcome"])
+documents_total = registry.counter("scrape_documents_total", "Documents extracted.")
+llm_seconds = registry.histogram(
+    "llm_request_duration_seconds", "Time of one chunk request to the model, including retries and rate-limit waits.")
+llm_requests_total = registry.counter(
+    "llm_requests_total", "Chunk requests to the model by result: ok, cache_hit, json_error or error.", ["result"])
+llm_tokens_total = registry.counter("llm_tokens_total", "Model tokens used, by kind: prompt or completion.", ["kind"])
+
+def record_stage(stage, seconds):
+    stage_seconds.inc(seconds, stage=stage)
+
+@contextmanager
+def timed(stage):
+    """Add the time spent in the block to the process-wide total for 'stage'."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+class StageTimer:
+    """
+    Per-job stage timings. Times are exclusive: while a nested stage runs (e.g. page
+    extraction pulled from inside chunking) the enclosing stage's clock is paused.
+    Every measurement is also added to the process-wide scrape_stage_seconds_total.
+    """
+    def __init__(self):
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @contextmanager
+    def stage(self, name):
+        stack = self.local.__dict__.setdefault("stack", [])
+        stack.append(0.0)  # Time spent in stages nested inside this one
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            own = elapsed - stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self.lock:
+                self.totals[name] = self.totals.get(name, 0.0) + own
+            record_stage(name, own)
+
+    def iterate(self, iterable, name):
+        """Yield from 'iterable', timing the work done to produce each item as stage 'name'."""
+        items = iter(iterable)
+        try:
+            while True:
+                with self.stage(name):
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        return
+                yield item
+        finally:
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    def breakdown(self):
+        """{stage: seconds}, rounded to the millisecond."""
+        with self.lock:
+            return {name: round(seconds, 3) for name, seconds in self.totals.items()}
@@ -0,0 +1,225 @@
+import hashlib
+import importlib
+import os
+import threading
+
+import pdfplumber
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+from pdfminer.pdftypes import PDFObjRef, PDFStream
+from llm_cache import ResponseCache, make_key
+
+# -----------------------------------------------------------------------------
+# Settings
+# -----------------------------------------------------------------------------
+PAGE_MIN_TEXT_CHARS = int(os.getenv("PAGE_MIN_TEXT_CHARS", 20))  # Below this, a page with images is treated as scanned
+TABLE_MIN_RULES = int(os.getenv("TABLE_MIN_RULES", 8))           # Drawn lines / cell borders that make a table page
+TABLE_MIN_ROWS = int(os.getenv("TABLE_MIN_ROWS", 3))             # Rows of separate text columns that make a table page
+COLUMN_GAP = 15.0  # Points between two pieces of text on one baseline for them to count as separate columns
+
+# OCR for image-only pages: "tesseract" (needs pytesseract and the tesseract binary), "none", or
+# "package.module:function" for any other local engine, called with a PIL image and returning text
+OCR_ENGINE = os.getenv("OCR_ENGINE", "tesseract")
+OCR_DPI = int(os.getenv("OCR_DPI", 300))
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+
+PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", "cache/page_cache.sqlite3")
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+
+# Page kinds
+TEXT, TABLE, IMAGE = "text", "table", "image"
+
+# PDFium may not be called from two threads at once, even for different documents
+pdfium_lock = threading.Lock()
+
+def classify_page(page, text):
+    """
+    TEXT, TABLE or IMAGE for a pypdfium2 page whose text layer is 'text'.
+    - IMAGE: (almost) no text layer, but images to read it from;
+    - TABLE: enough ruling lines or cell borders, or enough rows of text laid out in
+      separate columns, that the reading order of the text layer cannot be trusted;
+    - TEXT: everything else, which the text layer reads correctly.
+    """
+    objects = list(page.get_objects())
+    if len(text.strip()) < PAGE_MIN_TEXT_CHARS:
+        if any(obj.type == pdfium_c.FPDF_PAGEOBJ_IMAGE for obj in objects):
+            return IMAGE
+        return TEXT
+    if sum(1 for obj in objects if obj.type == pdfium_c.FPDF_PAGEOBJ_PATH) >= TABLE_MIN_RULES:
+        return TABLE
+    rows = {}
+    for obj in objects:
+        if obj.type == pdfium_c.FPDF_PAGEOBJ_TEXT:
+            left, bottom, right, _ = obj.get_pos()
+            rows.setdefault(round(bottom), []).append((left, right))
+    columned = 0
+    for spans in rows.values():
+        spans.sort()
+        if any(span[0] - previous[1] >= COLUMN_GAP for previous, span in zip(spans, spans[1:])):
+            columned += 1
+    return TABLE if columned >= TABLE_MIN_ROWS else TEXT
+
+def object_digest(obj, memo):
+    """
+    SHA-256 of a PDF object and everything it refers to. Indirect objects are hashed once
+    per document ('memo', by object id), so fonts and images shared by pages cost nothing
+    after the first page.
+    """
+    if isinstance(obj, PDFObjRef):
+        if obj.objid not in memo:
+            memo[obj.objid] = b""  # Cycle guard
+            memo[obj.objid] = object_digest(obj.resolve(), memo)
+        return memo[obj.objid]
+    digest = hashlib.sha256()
+    if isinstance(obj, PDFStream):
+        digest.update(object_digest(obj.attrs, memo))
+        raw = obj.get_rawdata()
+        digest.update(raw if raw is not None else obj.get_data())
+    elif isinstance(obj, dict):
+        for key in sorted(obj, key=str):
+            if key not in ("Parent", "P"):  # Back-links into the page tree
+                digest.update(str(key).encode("utf-8"))
+                digest.update(object_digest(obj[key], memo))
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            digest.update(object_digest(item, memo))
+    else:
+        digest.update(repr(obj).encode("utf-8"))
+    return digest.digest()
+
+def page_digest(page, memo):
+    """Hex digest of what a pdfplumber page draws: its content streams, resources and geometry."""
+    page_obj = page.page_obj
+    parts = [page_obj.contents, page_obj.resources, page_obj.mediabox, page_obj.cropbox, page_obj.rotate]
+    return object_digest(parts, memo).hex()
+
+def tesseract_ocr(image):
+    import pytesseract
+    return pytesseract.image_to_string(image, lang=OCR_LANGUAGE)
+
+def load_ocr(engine):
+    """The OCR function named by 'engine' (see OCR_ENGINE), or False if there is none."""
+    if engine.lower() in ("", "none"):
+        return False
+    if engine == "tesseract":
+        try:
+            import pytesseract
+            pytesseract.get_tesseract_version()
+        except Exception:
+            return False
+        return tesseract_ocr
+    module, _, name = engine.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+_ocr = None
+
+def get_ocr():
+    """The configured OCR function (PIL image -> text), loaded on first use, or False if unavailable."""
+    global _ocr
+    if _ocr is None:
+        _ocr = load_ocr(OCR_ENGINE)
+    return _ocr
+
+_page_cache = None
+_page_cache_pid = None
+
+def get_page_cache():
+    """
+    This process's cache of page text by page hash, or None if disabled. It is opened on
+    first use, and again in worker processes, which cannot share the parent's connection.
+    """
+    global _page_cache, _page_cache_pid
+    if not PAGE_CACHE_ENABLED:
+        return None
+    if _page_cache_pid != os.getpid():
+        _page_cache, _page_cache_pid = ResponseCache(PAGE_CACHE_PATH), os.getpid()
+    return _page_cache
+
+class PageReader:
+    """
+    Reads a PDF page by page, each page the cheapest way that works for it:
+    - TEXT pages: the PDFium text layer, which is fast;
+    - TABLE pages: pdfplumber, whose layout analysis keeps table rows together;
+    - IMAGE pages (scans): rendered and passed to the OCR engine, if one is available.
+    pdfplumber is only opened once a page needs it. Table and OCR results are cached on
+    the page's content hash, so a page seen before (in this document or any other) is
+    not analyzed again.
+    """
+    def __init__(self, pdf_path, use_cache=True):
+        self.pdf_path = pdf_path
+        self.cache = get_page_cache() if use_cache else None
+        self.plumber = None
+        self.memo = {}
+        self.digests = {}
+        with pdfium_lock:
+            self.pdf = pdfium.PdfDocument(pdf_path)
+            self.page_count = len(self.pdf)
+
+    def __len__(self):
+        return self.page_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.plumber is not None:
+            self.plumber.close()
+        with pdfium_lock:
+            self.pdf.close()
+
+    def plumber_page(self, index):
+        """The pdfplumber page at 'index'. Its hash is taken on first access, before any parsing decodes its streams."""
+        if self.plumber is None:
+            self.plumber = pdfplumber.open(self.pdf_path)
+        page = self.plumber.pages[index]
+        if index not in self.digests:
+            self.digests[index] = page_digest(page, self.memo)
+        return page
+
+    def read(self, index, keep_layout=False):
+        """
+        (text, kind, method) for the page at 'index' (0-based). 'method' says how the text was
+        obtained: "text_layer", "pdfplumber", "ocr", "cache", or "no_ocr" for a scanned page
+        left empty because no OCR engine is available. With 'keep_layout', a page parsed by
+        pdfplumber is left open, so plumber_page(index) can be queried further without
+        parsing it again; the caller closes it.
+        """
+        with pdfium_lock:
+            page = self.pdf[index]
+            textpage = page.get_textpage()
+            text = textpage.get_text_bounded().replace("\r\n", "\n").replace("\r", "\n")
+            textpage.close()
+            kind = classify_page(page, text)
+            page.close()
+        if kind == TEXT:
+            return text, kind, "text_layer"
+
+        settings = ()
+        if kind == IMAGE:
+            ocr = get_ocr()
+            if not ocr:
+                return "", kind, "no_ocr"
+            settings = (OCR_ENGINE, OCR_DPI, OCR_LANGUAGE)
+        self.plumber_page(index)
+        key = make_key(self.digests[index], kind, *settings)
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            return cached, kind, "cache"
+
+        if kind == TABLE:
+            page = self.plumber_page(index)
+            text, method = page.extract_text() or "", "pdfplumber"
+            if not keep_layout:
+                page.close()  # Drop the parsed layout objects; we only keep the text
+        else:
+            with pdfium_lock:
+                page = self.pdf[index]
+                image = page.render(scale=OCR_DPI / 72).to_pil()
+                page.close()
+            text, method = ocr(image) or "", "ocr"
+        if self.cache is not None:
+            self.cache.put(key, text)
+        return text, kind, method
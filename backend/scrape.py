@@ -1,210 +1,685 @@
-import pdfplumber
 import json
-import openai
+import multiprocessing
 import os
 from dotenv import load_dotenv
-import re
-from openpyxl import load_workbook
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from llm_cache import chunk_cache, make_key
+from fields import FIELDS, FIELD_NAMES, FIELD_PATTERNS, value_pattern
+from fast_path import extract_fields_fast
+from candidates import CandidateStore, clean_value
+from llm_client import LLMError, get_client, retry_after_seconds
+from pdf_pages import PageReader
+from workbook import TEMPLATE_FILE, get_template
+from metrics import (StageTimer, timed, chunks_total, documents_total, llm_requests_total, llm_seconds,
+                     llm_tokens_total, page_reads_total, pages_total, scrape_seconds)
 
 load_dotenv()
 
-# List of fields to extract
-FIELDS = (
-    "Closing Date, First Payment Date, Day Count System, Payment Frequency, "
-    "Payment Frequency Add. Description, Description, Rate Adjustment Frequency, Initial Asset Balance, "
-    "Current Prepaid Balance, Asset Amortization Type, WA Fixed Rate, Prepayment Type, "
-    "Fixed Prepayment Rate, Default Rate, Recoverable, Original Term, Loss Multiple, Base Losses, "
-    "Remaining Term, Discount Rate, WA Original Amortization Term, WA Original Balloon Payment Month, "
-    "WA Original Interest Only Period, WA Original Interest Capitalization Period, WALA, Recoveries Lag"
-)
+# Chunking is measured in model tokens. Chunks are packed up to CHUNK_TOKENS, preferring to
+# break at page, then paragraph, then line boundaries, and never inside a run of table rows.
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 2000))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 64))  # Trailing lines repeated at the start of the next chunk
+CHUNK_MIN_FILL = 0.5  # Only back up to a better boundary if the chunk stays at least this full
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
 
-CHUNK_SIZE = 3000  # Adjust chunk size (in characters) to avoid going over model token limits
+# PDF text extraction: with PDF_WORKERS > 1, page ranges of PDF_BATCH_PAGES are parsed on a process pool.
+# Its workers are spawned, not forked: a fork from a process with other job threads could copy
+# pdf_pages.pdfium_lock while another thread holds it, and the worker would wait for it forever.
+# The pool is started once per process and shared by every document (see get_pdf_pool).
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", 1))
+PDF_BATCH_PAGES = int(os.getenv("PDF_BATCH_PAGES", 8))
+
+# Concurrency / rate limiting for the Azure OpenAI calls
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", 4))          # Chunks in flight at once (1 = sequential)
+# Shared across every user, job and batch file in the process, so set it to the deployment's
+# quota; 0 (or less) turns the limiter off and leaves throttling to 429 responses and retries
+REQUESTS_PER_MINUTE = float(os.getenv("REQUESTS_PER_MINUTE", 600))
+MAX_RETRIES = int(os.getenv("MAX_RETRIES", 5))                  # Retries on 429 / 5xx / connection errors
+RETRY_BACKOFF = float(os.getenv("RETRY_BACKOFF", 1.0))          # Base delay in seconds, doubled per attempt
+MAX_LLM_IN_FLIGHT = int(os.getenv("MAX_LLM_IN_FLIGHT", 16))     # LLM calls in flight across all jobs in the process
+
+# Stop sending chunks once every field has a value, and only ask for the missing ones
+EARLY_STOP = os.getenv("EARLY_STOP", "true").lower() not in ("0", "false", "no")
+
+# Relevance pre-filter: only chunks scoring at least RELEVANCE_MIN_SCORE are sent to the model
+PREFILTER = os.getenv("PREFILTER", "true").lower() not in ("0", "false", "no")
+RELEVANCE_MIN_SCORE = float(os.getenv("RELEVANCE_MIN_SCORE", 1.0))
+RELEVANCE_KEEP_LEADING = int(os.getenv("RELEVANCE_KEEP_LEADING", 1))  # Leading chunks always sent (term sheet)
+RELEVANCE_FALLBACK_CHUNKS = int(os.getenv("RELEVANCE_FALLBACK_CHUNKS", 4))  # Skipped chunks re-sent at most if fields are missing
+
+# Rule-based term-sheet extraction (fast_path.py) runs before any LLM call
+FAST_PATH = os.getenv("FAST_PATH", "true").lower() not in ("0", "false", "no")
+
+# Re-extraction of single fields: chunks (best-scoring first) tried per field
+REEXTRACT_CHUNKS_PER_FIELD = int(os.getenv("REEXTRACT_CHUNKS_PER_FIELD", 3))
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Tokens refill at 'rate' per second up to 'capacity';
+    acquire() blocks until a token is available. A rate of 0 or less means no limit.
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+rate_limiter = TokenBucket(REQUESTS_PER_MINUTE / 60.0, capacity=MAX_CONCURRENCY)
+llm_slots = threading.BoundedSemaphore(MAX_LLM_IN_FLIGHT)
+
+def call_with_retry(func, *args, max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF, **kwargs):
+    """
+    Call func(*args, **kwargs) through the shared rate limiter and in-flight limit,
+    retrying retryable errors with exponential backoff (plus jitter). Honors a
+    Retry-After header if sent.
+    """
+    for attempt in range(max_retries + 1):
+        rate_limiter.acquire()
+        try:
+            with llm_slots:
+                return func(*args, **kwargs)
+        except LLMError as e:
+            if attempt == max_retries or not e.retryable:
+                raise
+            delay = backoff * (2 ** attempt) + random.uniform(0, backoff)
+            time.sleep(max(delay, retry_after_seconds(e.headers) or 0))
+
+def map_in_order(func, items, max_workers=MAX_CONCURRENCY):
+    """
+    Apply func to each item and yield the results in input order.
+    With max_workers > 1 the calls run on a thread pool with at most max_workers in flight;
+    the next item is only scheduled after the caller has consumed a result, and closing
+    the generator stops scheduling altogether.
+    """
+    if max_workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    items = iter(items)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for item in items:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= max_workers:
+                    break
+            while pending:
+                yield pending.popleft().result()
+                for item in items:
+                    pending.append(executor.submit(func, item))
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
+
+def extract_page_range(pdf_path, start, stop):
+    """(text, method) for pages [start, stop) of a PDF (see pdf_pages.PageReader.read)."""
+    with PageReader(pdf_path) as reader:
+        pages = [reader.read(index) for index in range(start, stop)]
+    return [(text, method) for text, _, method in pages]
+
+_pdf_pools = {}
+_pdf_pools_pid = None
+_pdf_pools_lock = threading.Lock()
+
+def get_pdf_pool(workers):
+    """
+    This process's pool of 'workers' spawned PDF workers. It is started on first use and
+    kept, as a spawned worker takes about a second to start and import the PDF libraries.
+    """
+    global _pdf_pools, _pdf_pools_pid
+    with _pdf_pools_lock:
+        if _pdf_pools_pid != os.getpid():
+            _pdf_pools, _pdf_pools_pid = {}, os.getpid()
+        if workers not in _pdf_pools:
+            _pdf_pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pdf_pools[workers]
+
+def drop_pdf_pool(workers, pool):
+    """Forget a broken pool, so the next document starts a new one."""
+    with _pdf_pools_lock:
+        if _pdf_pools.get(workers) is pool:
+            del _pdf_pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def iter_pdf_pages(pdf_path, workers=PDF_WORKERS, batch_pages=PDF_BATCH_PAGES, methods=None):
+    """
+    Yield (page_number, text) for every page, in order, as soon as each page is parsed.
+    Each page is read the cheapest way that works for it: the text layer, pdfplumber for
+    tables, or OCR for scanned pages (see pdf_pages.PageReader). If a 'methods' dict is
+    passed, it counts the pages read by each method.
+    With workers > 1, page ranges of 'batch_pages' are parsed on a process pool; pages
+    are still yielded in order, starting as soon as the first range is done.
+    """
+    def counted(page_number, text, method):
+        page_reads_total.inc(method=method)
+        if methods is not None:
+            methods[method] = methods.get(method, 0) + 1
+        return page_number, text
+
+    if workers <= 1:
+        with PageReader(pdf_path) as reader:
+            for index in range(len(reader)):
+                text, _, method = reader.read(index)
+                yield counted(index + 1, text, method)
+        return
+
+    with PageReader(pdf_path, use_cache=False) as reader:
+        page_count = len(reader)
+    ranges = [(start, min(start + batch_pages, page_count)) for start in range(0, page_count, batch_pages)]
+
+    pool = get_pdf_pool(workers)
+    futures = []
+    try:
+        futures = [pool.submit(extract_page_range, pdf_path, start, stop) for start, stop in ranges]
+        for (start, _), future in zip(ranges, futures):
+            for offset, (page_text, method) in enumerate(future.result()):
+                yield counted(start + offset + 1, page_text, method)
+    except BrokenProcessPool:
+        drop_pdf_pool(workers, pool)
+        raise
+    finally:
+        for future in futures:
+            future.cancel()  # Ranges not started yet when the caller stopped reading early
 
 def extract_text_from_pdf(pdf_path):
     """Extract text from a PDF file."""
-    text = ""
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-    return text
-
-def chunk_text(text, chunk_size=CHUNK_SIZE):
-    """
-    Break the text into smaller chunks to handle large inputs.
-    Adjust chunk_size as needed based on your token/model constraints.
-    """
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunks.append(text[start:end])
-        start = end
-    return chunks
-
-def parse_chunk_with_openai(chunk, api_key, azure_endpoint, deployment_id, api_version):
-    """Send a chunk of text to Azure OpenAI for parsing key-value pairs."""
-    openai.api_type = "azure"
-    openai.api_key = api_key
-    openai.api_base = azure_endpoint
-    openai.api_version = api_version
+    with timed("extract_text"):
+        return "".join(page_text + "\n" for _, page_text in iter_pdf_pages(pdf_path) if page_text)
+
+_encoding = None
+
+def get_encoding():
+    """
+    The tiktoken encoding used to measure chunks, or False if tiktoken is not installed
+    or its encoding files cannot be loaded (they are downloaded on first use).
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            _encoding = False
+    return _encoding
+
+def count_tokens(text):
+    """Number of model tokens in 'text' (about 4 characters per token without tiktoken)."""
+    encoding = get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def split_to_token_limit(text, max_tokens):
+    """Hard-split a single block that is larger than max_tokens on its own."""
+    encoding = get_encoding()
+    if encoding:
+        tokens = encoding.encode(text)
+        return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+    step = max_tokens * 4
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+# Break priorities: how good a place the start of a line is to begin a new chunk
+BREAK_TABLE, BREAK_LINE, BREAK_PARAGRAPH, BREAK_PAGE = 0, 1, 2, 3
+
+def iter_lines(pages):
+    """
+    Yield (line, break_priority) for every line of every page. Lines are the smallest
+    unit we chunk on, so a label and the value printed next to it always stay together.
+    """
+    previous = ""
+    for _, page_text in pages:
+        if not page_text:
+            continue
+        priority = BREAK_PAGE
+        for line in page_text.split("\n"):
+            if not line.strip():
+                priority = max(priority, BREAK_PARAGRAPH)
+                continue
+            if priority != BREAK_PAGE:
+                if previous.rstrip().endswith("."):
+                    priority = BREAK_PARAGRAPH
+                elif value_pattern.search(line) and value_pattern.search(previous):
+                    priority = BREAK_TABLE  # Consecutive rows of figures: keep the table together
+            yield line, priority
+            previous = line
+            priority = BREAK_LINE
+
+def iter_chunks(pages, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Consume (page_number, text) pairs and yield chunks of at most 'max_tokens' tokens,
+    each as soon as enough pages have been read.
+
+    Lines are packed greedily; when the next line does not fit, the chunk is cut at the
+    best boundary (page > paragraph > line > inside a table) that keeps it at least
+    CHUNK_MIN_FILL full. The last lines of each chunk, up to 'overlap_tokens', are
+    repeated at the start of the next one when there is room.
+    """
+    lines = []    # [line, tokens, break_priority]
+    carried = 0   # Leading entries of 'lines' that repeat the previous chunk
+    min_fill = max_tokens * CHUNK_MIN_FILL
+
+    def cut(incoming, incoming_priority):
+        nonlocal lines, carried
+        # Best boundary once the chunk is full enough (including right before the incoming
+        # line); the latest one wins ties
+        split, best, running = len(lines), -1, 0
+        boundaries = [line[2] for line in lines] + [incoming_priority]
+        for i, priority in enumerate(boundaries):
+            if i > carried and running >= min_fill and priority >= best:
+                split, best = i, priority
+            if i < len(lines):
+                running += lines[i][1]
+        emitted, rest = lines[:split], lines[split:]
+
+        overlap, overlap_total = [], 0
+        for line in reversed(emitted[carried:]):
+            if overlap_total + line[1] > overlap_tokens:
+                break
+            overlap.insert(0, [line[0], line[1], BREAK_LINE])
+            overlap_total += line[1]
+        if overlap_total + sum(line[1] for line in rest) + incoming > max_tokens:
+            overlap = []
+        lines, carried = overlap + rest, len(overlap)
+        return "\n".join(line[0] for line in emitted) + "\n"
+
+    for line, priority in iter_lines(pages):
+        pieces = [line]
+        if count_tokens(line) + 1 > max_tokens:
+            pieces = split_to_token_limit(line, max_tokens - 1)
+        for piece in pieces:
+            tokens = count_tokens(piece) + 1  # +1 for the newline
+            while len(lines) > carried and sum(line[1] for line in lines) + tokens > max_tokens:
+                yield cut(tokens, priority)
+            if carried == len(lines) and sum(line[1] for line in lines) + tokens > max_tokens:
+                lines, carried = [], 0
+            lines.append([piece, tokens, priority])
+            priority = BREAK_LINE
+    if len(lines) > carried:
+        yield "\n".join(line[0] for line in lines) + "\n"
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Break the text into chunks of at most 'max_tokens' model tokens, preferring
+    paragraph and line boundaries (see iter_chunks).
+    """
+    with timed("chunk_text"):
+        return list(iter_chunks([(1, text)], max_tokens, overlap_tokens))
+
+def parse_chunk_with_openai(chunk, api_key, azure_endpoint, deployment_id, api_version, cache=chunk_cache, fields=FIELDS,
+                            usage=None):
+    """
+    Send a chunk of text to Azure OpenAI for parsing key-value pairs.
+    'fields' is the comma-separated list of fields to ask for (defaults to all of FIELDS).
+    Successful responses are cached on (chunk, fields, prompt, deployment_id), so a
+    repeated chunk is answered from 'cache' without an API call. Pass cache=None to bypass.
+    If a 'usage' dict is passed, the call's prompt_tokens / completion_tokens are stored in it.
+    Requests go through the pooled client for these settings (see llm_client.get_client).
+    """
+    client = get_client(azure_endpoint, deployment_id, api_key, api_version)
 
     system_prompt = (
         "You are a data extraction AI. You must return only valid JSON containing "
-        "any of the following fields if found: " + FIELDS + ". If a field is not found, omit it. "
+        "any of the following fields if found: " + fields + ". If a field is not found, omit it. "
         "Do not include any extra keys, text, or commentary. Output only valid JSON."
     )
 
     user_prompt = (
         f"Text to parse:\n{chunk}\n\n"
-        f"Fields to extract: {FIELDS}\n\n"
+        f"Fields to extract: {fields}\n\n"
         "Return only valid JSON with only the fields you find."
     )
 
-    response = openai.ChatCompletion.create(
-        engine=deployment_id,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0.5,
-        max_tokens=1200,
-    )
+    cache_key = make_key(chunk, fields, system_prompt, deployment_id)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            llm_requests_total.inc(result="cache_hit")
+            return cached
+
+    started = time.perf_counter()
+    try:
+        response = call_with_retry(
+            client.chat,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=0.5,
+            max_tokens=1200,
+        )
+    except Exception:
+        llm_requests_total.inc(result="error")
+        raise
+    finally:
+        llm_seconds.observe(time.perf_counter() - started)
+
+    prompt_tokens = response.get("usage", {}).get("prompt_tokens", 0)
+    completion_tokens = response.get("usage", {}).get("completion_tokens", 0)
+    llm_tokens_total.inc(prompt_tokens, kind="prompt")
+    llm_tokens_total.inc(completion_tokens, kind="completion")
+    if usage is not None:
+        usage["prompt_tokens"] = prompt_tokens
+        usage["completion_tokens"] = completion_tokens
 
     structured_data = response["choices"][0]["message"]["content"]
     # Attempt to parse JSON from the chunk's response
     try:
         chunk_json = json.loads(structured_data)
     except json.JSONDecodeError:
+        llm_requests_total.inc(result="json_error")
         return {"error": "Failed to parse JSON", "response": structured_data}
+    llm_requests_total.inc(result="ok")
+    if cache is not None:
+        cache.put(cache_key, chunk_json)
     return chunk_json
 
-def merge_dicts(main_dict, new_dict):
+def score_chunk(chunk, fields=FIELD_NAMES):
+    """
+    Cheap local relevance score for a chunk:
+    - 1 point for every field in 'fields' whose label/synonym appears in the chunk.
+    - Up to 1 point for numeric density (dollar amounts, percentages, dates per 1,000 chars).
+    """
+    if not chunk:
+        return 0.0
+    label_hits = sum(1 for field in fields if FIELD_PATTERNS[field].search(chunk))
+    values_per_1k = len(value_pattern.findall(chunk)) * 1000 / len(chunk)
+    return label_hits + min(values_per_1k / 10.0, 1.0)
+
+def select_relevant_chunks(chunks, skipped, fields=FIELD_NAMES, min_score=RELEVANCE_MIN_SCORE, keep_leading=RELEVANCE_KEEP_LEADING):
     """
-    Merge key-value pairs from new_dict into main_dict.
-    If a key already exists, decide how to handle collisions (overwrite or combine).
+    Yield (index, chunk) for the chunks worth sending to the model, appending the others
+    to 'skipped' the same way. Works on a stream: each chunk is scored as it arrives.
+    A chunk is selected if it is among the first 'keep_leading' chunks or scores at least 'min_score'.
     """
-    for key, value in new_dict.items():
-        # If the field doesn't exist or it's an error, overwrite
-        if key not in main_dict or key == "error":
-            main_dict[key] = value
+    for index, chunk in enumerate(chunks):
+        if index < keep_leading or score_chunk(chunk, fields) >= min_score:
+            yield index, chunk
         else:
-            # If both are strings and different, we can combine them
-            if isinstance(main_dict[key], str) and isinstance(value, str) and main_dict[key] != value:
-                main_dict[key] += f"; {value}"
-            else:
-                main_dict[key] = value
-    return main_dict
+            skipped.append((index, chunk))
 
-def pdf_to_json(pdf_path, api_key, azure_endpoint, deployment_id, api_version):
+def missing_fields(data):
+    """Return the fields in FIELD_NAMES that have no value in 'data' yet."""
+    return [field for field in FIELD_NAMES if data.get(field) in (None, "")]
+
+def pdf_to_json(pdf_path, api_key, azure_endpoint, deployment_id, api_version,
+                max_concurrency=MAX_CONCURRENCY, early_stop=EARLY_STOP, prefilter=PREFILTER,
+                fast_path=FAST_PATH, stats=None, progress=None):
     """
     Convert a large PDF file into structured JSON data by chunking the extracted text.
+    Fast-path values come first; chunks are then streamed to the model up to 'max_concurrency'
+    at a time, and every answer is a vote resolved per field at the end (candidates.CandidateStore).
+    Answers are merged in document order, so the result matches max_concurrency=1.
     """
-    extracted_text = extract_text_from_pdf(pdf_path)
-    chunks = chunk_text(extracted_text, CHUNK_SIZE)
+    started = time.perf_counter()
+    timer = StageTimer()
+    store = CandidateStore()
+    if fast_path:
+        with timer.stage("fast_path"):
+            fast_hits = extract_fields_fast(pdf_path)
+        for field, hit in fast_hits.items():
+            store.add(field, hit["value"], {"source": hit["source"], "page": hit["page"], "chunk": None},
+                      confidence=hit["confidence"])
+    # Fields the model is not asked for (again): high-confidence fast-path values, which are
+    # never asked, and fields the model has already answered
+    fast_fields = {field for field, hit in fast_hits.items() if hit["confidence"] == "high"} if fast_path else set()
+    settled = set(fast_fields)
+    missing = [field for field in FIELD_NAMES if field not in settled]
+    llm_fields = ", ".join(missing)
 
-    final_data = {}
-    for i, chunk in enumerate(chunks):
-        chunk_data = parse_chunk_with_openai(
-            chunk, api_key, azure_endpoint, deployment_id, api_version
-        )
-        if "error" not in chunk_data:
-            final_data = merge_dicts(final_data, chunk_data)
+    page_count = 0
+    page_methods = {}
+    chunk_count = 0
+    chunks_done = 0
+    chunk_texts = []
+    chunk_pages = []
+    sent = []
+    skipped = []
+    json_errors = 0
+    tokens = {"prompt_tokens": 0, "completion_tokens": 0}
+    usage_lock = threading.Lock()
+
+    # progress(event, info) is called after the fast path ("fast_path"), for every page read
+    # ("page"), after every chunk result ("chunk") and at the end ("done")
+    def report(event):
+        if progress is not None:
+            progress(event, {
+                "pages_read": page_count,
+                "chunks_read": chunk_count,
+                "chunks_sent": len(sent),
+                "chunks_done": chunks_done,
+                "fields_found": len(store.candidates),
+                "fields_total": len(FIELD_NAMES),
+                "data": store.leaders(),
+            })
+
+    def count_pages(pages):
+        nonlocal page_count
+        for page in pages:
+            page_count += 1
+            pages_total.inc()
+            report("page")
+            yield page
+
+    def stream_chunks():
+        # Pages are parsed lazily, so the first LLM calls start before the last page is read
+        nonlocal chunk_count
+        if not missing:
+            return
+        pages = timer.iterate(iter_pdf_pages(pdf_path, methods=page_methods), "extract_text")
+        for chunk in timer.iterate(iter_chunks(count_pages(pages)), "chunk_text"):
+            chunk_count += 1
+            chunk_texts.append(chunk)
+            chunk_pages.append(page_count)
+            yield chunk
+
+    def parse(item):
+        index, chunk = item
+        fields = ", ".join(missing) if early_stop else llm_fields
+        if not fields:
+            return index, {}
+        sent.append(chunk)
+        usage = {}
+        with timer.stage("llm_call"):
+            chunk_data = parse_chunk_with_openai(chunk, api_key, azure_endpoint, deployment_id, api_version,
+                                                 fields=fields, usage=usage)
+        with usage_lock:
+            for key, count in usage.items():
+                tokens[key] += count
+        return index, chunk_data
+
+    def run(batch):
+        nonlocal missing, chunks_done, json_errors
+        results = map_in_order(parse, batch, max_concurrency)
+        for index, chunk_data in results:
+            if "error" in chunk_data:
+                json_errors += 1
+            else:
+                # With early_stop, a chunk in flight may have been asked for fields an earlier chunk
+                # has since answered; the sequential path would not have asked, so those are ignored
+                with timer.stage("merge"):
+                    source = {"source": "llm", "page": chunk_pages[index], "chunk": index}
+                    for key, value in chunk_data.items():
+                        if key in FIELD_NAMES and key not in fast_fields and (not early_stop or key in missing):
+                            store.add(key, value, source)
+                            if clean_value(value) not in (None, ""):
+                                settled.add(key)
+            missing = [field for field in FIELD_NAMES if field not in settled]
+            chunks_done += 1
+            report("chunk")
+            if early_stop and not missing:
+                results.close()
+                break
+
+    report("fast_path")
+    chunks = stream_chunks()
+    try:
+        if prefilter:
+            run(timer.iterate(select_relevant_chunks(chunks, skipped, missing), "prefilter"))
         else:
-            pass
+            run(enumerate(chunks))
+    finally:
+        chunks.close()
+    # Recall fallback for fields the relevant chunks did not answer
+    if skipped and missing:
+        scored = [(score_chunk(chunk, missing), index, chunk) for index, chunk in skipped]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        run([(index, chunk) for score, index, chunk in scored[:RELEVANCE_FALLBACK_CHUNKS] if score > 0])
+
+    with timer.stage("merge"):
+        final_data, confidence, sources = store.resolve()
+
+    elapsed = time.perf_counter() - started
+    chunks_total.inc(len(sent), outcome="sent")
+    chunks_total.inc(chunk_count - len(sent), outcome="skipped")
+    documents_total.inc()
+    scrape_seconds.observe(elapsed)
+
+    # confidence per field: "high"/"medium" from the fast path, "llm" from the model, "low"
+    # for conflicting model answers with no majority (see conflicts). sources: {"source":
+    # "table" | "text" | "llm", "page", "chunk"}. chunks and chunk_pages keep the text read,
+    # for reextract_fields. llm_call in timings sums overlapping calls, so it can exceed total.
+    if stats is not None:
+        stats["pages"] = page_count
+        stats["page_methods"] = page_methods
+        stats["chunks_total"] = chunk_count
+        stats["chunks_sent"] = len(sent)
+        stats["chunks_skipped"] = chunk_count - len(sent)
+        stats["confidence"] = confidence
+        stats["sources"] = sources
+        stats["conflicts"] = store.conflicts()
+        stats["chunks"] = chunk_texts
+        stats["chunk_pages"] = chunk_pages
+        stats.update(tokens)
+        stats["json_errors"] = json_errors
+        stats["timings"] = {**timer.breakdown(), "total": round(elapsed, 3)}
+    report("done")
     return final_data
 
-# Regex Patterns
-dollar_pattern = re.compile(r'^\$\s*[\d,]+(\.\d+)?$')   # e.g. "$ 550,462,191", "$123,456.78"
-percent_pattern = re.compile(r'^[\d,]+(\.\d+)?%$')      # e.g. "12%", "12.34%", "1,234.56%"
-numeric_pattern = re.compile(r'^[\d,]+(\.\d+)?$')       # e.g. "1234", "1,234.56", "1234.56"
-
-# Assuming you have these precompiled patterns already defined:
-dollar_pattern = re.compile(r"^\$\s*[\d,]+(?:\.\d+)?$")
-percent_pattern = re.compile(r"^[\d,]+(?:\.\d+)?\s*%$")
-numeric_pattern = re.compile(r"^[\d,]+(?:\.\d+)?$")
-
-def save_to_excel(data_dict, output_file, template_file="excel_templates/template.xlsx", ):
-    """
-    1) Open 'template_file' and activate the sheet named 'Inputs'.
-    2) Search all cells in 'Inputs' for a matching key from data_dict.
-    3) If a cell's value matches a key, get the dictionary value and:
-       - If it starts with "$" (optional spaces allowed), parse as float and apply currency format.
-       - If it ends with "%", parse as float/100 and apply percentage format.
-       - If it's strictly numeric (with optional commas/decimal), parse as float.
-       - Otherwise, if the value contains digits mixed with words, remove the non-numeric characters and parse as float.
-       - If no digits are found, write as text.
-    4) Save the modified workbook as 'output_file'.
-    """
-    wb = load_workbook(template_file)
-    sheet = wb["Inputs"]
-    max_row = sheet.max_row
-    max_col = sheet.max_column
-
-    for row in range(1, max_row + 1):
-        for col in range(1, max_col + 1):
-            cell = sheet.cell(row=row, column=col)
-            cell_value = cell.value
-
-            if cell_value is not None:
-                field_label = str(cell_value).strip()
-
-                if field_label in data_dict:
-                    out_cell = sheet.cell(row=row, column=col + 1)
-                    raw_value = str(data_dict[field_label]).strip()
-
-                    # 1) Currency format (allows space after $)
-                    if dollar_pattern.match(raw_value):
-                        # Remove '$', any spaces, and commas
-                        numeric_str = raw_value.replace("$", "").replace(" ", "").replace(",", "")
-                        numeric_val = float(numeric_str)
-                        out_cell.value = numeric_val
-                        out_cell.number_format = '$#,##0.00'
-                        continue
-
-                    # 2) Percentage format
-                    if percent_pattern.match(raw_value):
-                        numeric_str = raw_value.replace("%", "").replace(",", "")
-                        numeric_val = float(numeric_str) / 100.0
-                        out_cell.value = numeric_val
-                        out_cell.number_format = '0.00%'
-                        continue
-
-                    # 3a) Generic numeric (exactly matching numeric pattern)
-                    if numeric_pattern.match(raw_value):
-                        numeric_str = raw_value.replace(",", "")
-                        numeric_val = float(numeric_str)
-                        out_cell.value = numeric_val
-                        out_cell.number_format = 'General'
-                        continue
-
-                    # 3b) Mixed value with words: if any digits are present, remove non-numeric characters
-                    if any(char.isdigit() for char in raw_value):
-                        # This regex keeps digits, the decimal point, and a possible minus sign
-                        cleaned_str = re.sub(r"[^\d\.\/\-]", "", raw_value)
-                        try:
-                            numeric_val = float(cleaned_str)
-                            out_cell.value = numeric_val
-                            out_cell.number_format = 'General'
-                        except ValueError:
-                            # If conversion fails, fallback to the original text
-                            out_cell.value = raw_value
-                        continue
-
-                    # 4) Fallback to text if no digits are found
-                    out_cell.value = raw_value
-    
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    wb.save(output_file)
-
-def scrape(PDF_PATH, username):
+def reextract_fields(chunks, fields, api_key, azure_endpoint, deployment_id, api_version,
+                     chunk_pages=None, per_field=REEXTRACT_CHUNKS_PER_FIELD,
+                     max_concurrency=MAX_CONCURRENCY, stats=None):
+    """
+    Ask the model again for just 'fields', against just the chunks most likely to hold
+    them ('chunks' as kept by pdf_to_json in stats["chunks"]), instead of re-running the
+    whole document.
+
+    For every field the 'per_field' best chunks by score_chunk are picked. Chunks are then
+    sent best-ranked first, each asking only for the fields it was picked for that are still
+    missing; the first value found for a field wins (cleaned as in pdf_to_json). The response
+    cache is bypassed, since the point is a fresh answer.
+
+    Returns {field: value} for the fields found. If a 'stats' dict is passed, sources (as in
+    pdf_to_json), chunks_sent, json_errors, prompt_tokens / completion_tokens and timings
+    are recorded in it.
+    """
+    started = time.perf_counter()
+    timer = StageTimer()
+    plan = {}  # Chunk index -> fields it was picked for
+    rank = {}  # Chunk index -> best rank it was picked at
+    for field in fields:
+        ranked = sorted(range(len(chunks)), key=lambda i: score_chunk(chunks[i], [field]), reverse=True)
+        for position, index in enumerate(ranked[:per_field]):
+            plan.setdefault(index, []).append(field)
+            rank[index] = min(rank.get(index, position), position)
+    batch = sorted(plan, key=lambda index: (rank[index], index))
+
+    store = CandidateStore()
+    sent = []
+    json_errors = 0
+    tokens = {"prompt_tokens": 0, "completion_tokens": 0}
+    usage_lock = threading.Lock()
+
+    def parse(index):
+        wanted = [field for field in plan[index] if not store.has(field)]
+        if not wanted:
+            return index, {}
+        sent.append(index)
+        usage = {}
+        with timer.stage("llm_call"):
+            chunk_data = parse_chunk_with_openai(chunks[index], api_key, azure_endpoint, deployment_id, api_version,
+                                                 cache=None, fields=", ".join(wanted), usage=usage)
+        with usage_lock:
+            for key, count in usage.items():
+                tokens[key] += count
+        return index, chunk_data
+
+    results = map_in_order(parse, batch, max_concurrency)
+    try:
+        for index, chunk_data in results:
+            if "error" in chunk_data:
+                json_errors += 1
+                continue
+            source = {"source": "llm", "page": chunk_pages[index] if chunk_pages else None, "chunk": index}
+            for field in plan[index]:
+                if not store.has(field) and field in chunk_data:
+                    store.add(field, chunk_data[field], source)
+            if all(store.has(field) for field in fields):
+                break
+    finally:
+        results.close()
+    found, _, sources = store.resolve()
+
+    if stats is not None:
+        stats["sources"] = sources
+        stats["chunks_sent"] = len(sent)
+        stats["json_errors"] = json_errors
+        stats.update(tokens)
+        stats["timings"] = {**timer.breakdown(), "total": round(time.perf_counter() - started, 3)}
+    return found
+
+def save_to_excel(data_dict, output_file, template_file=TEMPLATE_FILE):
+    """
+    Fill the 'Inputs' sheet of the template with data_dict and save it as 'output_file'.
+    The template is parsed once per process (workbook.get_template); each call only writes
+    the cells next to matching labels, converting values with workbook.convert_value.
+    """
+    with timed("save_to_excel"):
+        wb = get_template(template_file).fill(data_dict)
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        wb.save(output_file)
+
+def scrape(PDF_PATH, progress=None, stats=None):
+    """Run the extraction pipeline on a PDF with the Azure settings from the environment."""
     AZURE_API_KEY = os.getenv("API_KEY")
     AZURE_ENDPOINT = os.getenv("AZURE_ENDPOINT")
     DEPLOYMENT_ID = os.getenv("DEPLOYMENT_NAME")
     API_VERSION = os.getenv("API_VERSION")
 
-    json_output = pdf_to_json(PDF_PATH, AZURE_API_KEY, AZURE_ENDPOINT, DEPLOYMENT_ID, API_VERSION)
-    save_to_excel(json_output, output_file=f"downloads/{username}/output.xlsx")
+    json_output = pdf_to_json(PDF_PATH, AZURE_API_KEY, AZURE_ENDPOINT, DEPLOYMENT_ID, API_VERSION, progress=progress, stats=stats)
+
+    return json_output
+
+def scrape_fields(chunks, fields, chunk_pages=None, progress=None, stats=None):
+    """Run reextract_fields on stored chunks with the Azure settings from the environment."""
+    AZURE_API_KEY = os.getenv("API_KEY")
+    AZURE_ENDPOINT = os.getenv("AZURE_ENDPOINT")
+    DEPLOYMENT_ID = os.getenv("DEPLOYMENT_NAME")
+    API_VERSION = os.getenv("API_VERSION")
 
-    return json_output 
\ No newline at end of file
+    found = reextract_fields(chunks, fields, AZURE_API_KEY, AZURE_ENDPOINT, DEPLOYMENT_ID, API_VERSION,
+                             chunk_pages=chunk_pages, stats=stats)
+    if progress is not None:
+        progress("done", {"fields_found": len(found), "fields_total": len(fields), "data": found})
+    return found
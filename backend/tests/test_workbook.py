@@ -0,0 +1,47 @@
+import pytest
+from workbook import convert_value, normalize_label
+
+@pytest.mark.parametrize("value, expected", [
+    ("$ 550,462,191", (550462191.0, "$#,##0.00")),
+    ("$123,456.78", (123456.78, "$#,##0.00")),
+    ("$1000", (1000.0, "$#,##0.00")),
+])
+def test_currency(value, expected):
+    assert convert_value(value) == expected
+
+@pytest.mark.parametrize("value, expected", [
+    ("12.5%", 0.125),
+    ("12.34 %", 0.1234),
+    ("1,234.5%", 12.345),
+])
+def test_percent(value, expected):
+    cell_value, number_format = convert_value(value)
+    assert cell_value == pytest.approx(expected)
+    assert number_format == "0.00%"
+
+@pytest.mark.parametrize("value, expected", [
+    ("1234", 1234.0),
+    ("1,234.56", 1234.56),
+    (" 360 ", 360.0),
+    (42, 42.0),
+])
+def test_plain_number(value, expected):
+    assert convert_value(value) == (expected, "General")
+
+@pytest.mark.parametrize("value, expected", [
+    ("100 Months", 100.0),
+    ("6.00 months", 6.0),
+    ("-2 years", -2.0),
+])
+def test_mixed_digits_and_words(value, expected):
+    assert convert_value(value) == (expected, "General")
+
+@pytest.mark.parametrize("value", ["Monthly", "Actual/360", "Semi-Annual", "1/1/2020"])
+def test_text(value):
+    # No digits, or digits that do not form one number: written as text
+    assert convert_value(value) == (value, None)
+
+def test_normalize_label():
+    assert normalize_label("  Closing\nDate ") == "closing date"
+    assert normalize_label("WA  Fixed\tRate") == "wa fixed rate"
+    assert normalize_label("WALA") == normalize_label("wala")
@@ -0,0 +1,169 @@
+import io
+import os
+import re
+import threading
+from openpyxl import load_workbook
+from fields import FIELD_NAMES
+from metrics import timed
+
+TEMPLATE_FILE = "excel_templates/template.xlsx"
+INPUTS_SHEET = "Inputs"
+SUMMARY_SHEET = "Summary"
+
+# Regex Patterns
+dollar_pattern = re.compile(r"^\$\s*[\d,]+(?:\.\d+)?$")   # e.g. "$ 550,462,191", "$123,456.78"
+percent_pattern = re.compile(r"^[\d,]+(?:\.\d+)?\s*%$")   # e.g. "12%", "12.34 %", "1,234.56%"
+numeric_pattern = re.compile(r"^[\d,]+(?:\.\d+)?$")       # e.g. "1234", "1,234.56", "1234.56"
+
+def normalize_label(label):
+    """Compare labels ignoring case and runs of whitespace/newlines."""
+    return " ".join(str(label).split()).casefold()
+
+def convert_value(value):
+    """
+    Convert an extracted value to what gets written to the workbook, as (cell_value, number_format):
+    - "$ 1,234.5"  -> (1234.5, '$#,##0.00')      currency (spaces allowed after "$")
+    - "12.5%"      -> (0.125, '0.00%')           percentage
+    - "1,234"      -> (1234.0, 'General')        plain number
+    - "100 Months" -> (100.0, 'General')         digits mixed with words: non-numeric characters dropped
+    - "Monthly"    -> ("Monthly", None)          no digits (or not a valid number): written as text
+    """
+    raw_value = str(value).strip()
+
+    # 1) Currency format (allows space after $)
+    if dollar_pattern.match(raw_value):
+        return float(raw_value.replace("$", "").replace(" ", "").replace(",", "")), '$#,##0.00'
+
+    # 2) Percentage format
+    if percent_pattern.match(raw_value):
+        return float(raw_value.replace("%", "").replace(" ", "").replace(",", "")) / 100.0, '0.00%'
+
+    # 3a) Generic numeric (exactly matching numeric pattern)
+    if numeric_pattern.match(raw_value):
+        return float(raw_value.replace(",", "")), 'General'
+
+    # 3b) Mixed value with words: if any digits are present, remove non-numeric characters
+    if any(char.isdigit() for char in raw_value):
+        # This regex keeps digits, the decimal point, and a possible minus sign
+        cleaned_str = re.sub(r"[^\d\.\/\-]", "", raw_value)
+        try:
+            return float(cleaned_str), 'General'
+        except ValueError:
+            # If conversion fails, fallback to the original text
+            return raw_value, None
+
+    # 4) Fallback to text if no digits are found
+    return raw_value, None
+
+class Template:
+    """
+    An Excel template held in memory. The 'Inputs' sheet is scanned once into an index of
+    normalized label -> coordinates of the cell to its right, where the value goes.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        self.index = {}
+        sheet = load_workbook(io.BytesIO(self.data))[INPUTS_SHEET]
+        for row in sheet.iter_rows():
+            for cell in row:
+                if cell.value is not None and str(cell.value).strip():
+                    value_cell = sheet.cell(row=cell.row, column=cell.column + 1)
+                    self.index.setdefault(normalize_label(cell.value), []).append(value_cell.coordinate)
+
+    def new_workbook(self):
+        """A fresh, unmodified copy of the template."""
+        return load_workbook(io.BytesIO(self.data))
+
+    def write_values(self, sheet, data_dict):
+        """Write every value in data_dict next to its label on an Inputs-style sheet."""
+        for key, value in data_dict.items():
+            for coordinate in self.index.get(normalize_label(key), ()):
+                write_cell(sheet[coordinate], value)
+
+    def fill(self, data_dict):
+        """A fresh copy of the template with every value in data_dict written next to its label."""
+        wb = self.new_workbook()
+        self.write_values(wb[INPUTS_SHEET], data_dict)
+        return wb
+
+def write_cell(cell, value):
+    cell_value, number_format = convert_value(value)
+    cell.value = cell_value
+    if number_format:
+        cell.number_format = number_format
+
+def sheet_title(name, used):
+    """A unique, valid worksheet title (max 31 chars, no []:*?/\\) derived from a file name."""
+    base = re.sub(r"[\[\]:*?/\\]", "_", os.path.splitext(name)[0]).strip("' ") or "Deal"
+    title, n = base[:31], 1
+    while title.casefold() in used:
+        n += 1
+        suffix = f" ({n})"
+        title = base[:31 - len(suffix)] + suffix
+    used.add(title.casefold())
+    return title
+
+def render_workbook(data_dict, template_file=TEMPLATE_FILE):
+    """The filled template as .xlsx bytes, built entirely in memory."""
+    with timed("render_workbook"):
+        buffer = io.BytesIO()
+        get_template(template_file).fill(data_dict).save(buffer)
+        return buffer.getvalue()
+
+def render_batch_workbook(entries, template_file=TEMPLATE_FILE):
+    """
+    One workbook for a batch of deals, as .xlsx bytes. 'entries' is a list of dicts with
+    filename, status, seconds, error and result. It contains:
+    - a 'Summary' sheet comparing every field across deals, with per-file status and timing;
+    - one Inputs-style sheet per successful deal. These are value sheets: formulas that
+      point into the template's model sheets are dropped along with those sheets.
+    """
+    template = get_template(template_file)
+    wb = template.new_workbook()
+    originals = list(wb.worksheets)
+    inputs = wb[INPUTS_SHEET]
+
+    summary = wb.create_sheet(SUMMARY_SHEET)
+    summary.append(["Field"] + [entry["filename"] for entry in entries])
+    summary.append(["Status"] + [entry["status"] for entry in entries])
+    summary.append(["Seconds"] + [round(entry["seconds"], 2) for entry in entries])
+    summary.append(["Error"] + [entry.get("error") for entry in entries])
+    for field in FIELD_NAMES:
+        summary.append([field])
+        row = summary.max_row
+        for column, entry in enumerate(entries, 2):
+            value = (entry.get("result") or {}).get(field)
+            if value not in (None, ""):
+                write_cell(summary.cell(row=row, column=column), value)
+    summary.column_dimensions["A"].width = 42
+
+    used = {SUMMARY_SHEET.casefold()}
+    for entry in entries:
+        if entry["status"] != "done":
+            continue
+        sheet = wb.copy_worksheet(inputs)
+        sheet.title = sheet_title(entry["filename"], used)
+        for row in sheet.iter_rows():
+            for cell in row:
+                if isinstance(cell.value, str) and cell.value.startswith("=") and "!" in cell.value:
+                    cell.value = None
+        template.write_values(sheet, entry["result"])
+
+    for sheet in originals:
+        wb.remove(sheet)
+    wb.active = 0
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+def get_template(path=TEMPLATE_FILE):
+    """The parsed template for 'path', loaded from disk only the first time."""
+    with _templates_lock:
+        if path not in _templates:
+            _templates[path] = Template(path)
+        return _templates[path]
@@ -1,9 +1,35 @@
 import React, { useState } from 'react';
 import axios from 'axios';
 
+// Read a server-sent event stream from a fetch() response, calling onEvent(name, data) per event
+async function readEventStream(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let name = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) name = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (data) onEvent(name, JSON.parse(data));
+    }
+  }
+}
+
 function Upload() {
   const [file, setFile] = useState(null);
   const [result, setResult] = useState(null);
+  const [jobId, setJobId] = useState(null);
+  const [progress, setProgress] = useState(null);
   const [error, setError] = useState('');
   const [loading, setLoading] = useState(false);
   const token = localStorage.getItem('token');
@@ -21,6 +47,7 @@ function Upload() {
     const formData = new FormData();
     formData.append('file', file);
     setLoading(true);
+    setProgress(null);
     try {
       const response = await axios.post('http://localhost:8000/scrape', formData, {
         headers: {
@@ -28,7 +55,27 @@ function Upload() {
           Authorization: `Bearer ${token}`
         }
       });
-      setResult(response.data.scrape_result);
+      const jobId = response.data.job_id;
+      setJobId(jobId);
+
+      // The scrape runs as a background job: follow its progress and partial results
+      const events = await fetch(`http://localhost:8000/scrape/${jobId}/events`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      if (!events.ok) throw new Error('Error following scrape progress');
+      await readEventStream(events, (name, data) => {
+        if (name === 'complete') {
+          if (data.status === 'failed') {
+            setError(`Error during PDF scraping: ${data.error}`);
+            setResult(null);
+          } else {
+            setResult(data.scrape_result);
+          }
+          return;
+        }
+        setProgress(data);
+        if (Object.keys(data.data).length > 0) setResult(data.data);
+      });
     } catch (err) {
       console.error(err);
       setError(err.response?.data.detail || 'Error uploading file');
@@ -37,9 +84,28 @@ function Upload() {
     }
   };
 
+  const handleRetry = async () => {
+    setLoading(true);
+    setError('');
+    try {
+      const response = await axios.post(`http://localhost:8000/scrape/${jobId}/reextract`, {}, {
+        headers: {
+          Authorization: `Bearer ${token}`
+        }
+      });
+      setResult(response.data.scrape_result);
+    } catch (err) {
+      console.error(err);
+      setError(err.response?.data.detail || 'Error re-extracting fields');
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const handleDownload = async () => {
     try {
       const response = await axios.get('http://localhost:8000/download', {
+        params: { job_id: jobId },
         headers: {
           Authorization: `Bearer ${token}`
         },
@@ -87,6 +153,12 @@ function Upload() {
               <div className="spinner"></div>
             </div>
           )}
+          {loading && progress && (
+            <p>
+              Read {progress.pages_read} pages, found {progress.fields_found} of {progress.fields_total} fields
+              ({progress.chunks_done} of {progress.chunks_sent} chunks processed)
+            </p>
+          )}
           {result && (
             <div className="card" style={{ marginTop: '3%' }}>
               <h2>Scrape Result:</h2>
@@ -94,7 +166,7 @@ function Upload() {
             </div>
           )}
           {/* Excel Download Button */}
-          {result && 
+          {result && !loading && 
             <button 
             className="primary-button" 
             style={{ marginTop: '1rem' }} 
@@ -103,6 +175,15 @@ function Upload() {
             Download Excel
           </button>
           }
+          {result && !loading &&
+            <button
+            className="primary-button"
+            style={{ marginTop: '1rem', marginLeft: '1rem' }}
+            onClick={handleRetry}
+          >
+            Retry Missing Fields
+          </button>
+          }
         </div>
       </section>
     </div>